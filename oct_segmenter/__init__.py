@@ -1,11 +1,9 @@
+from functools import lru_cache
 from pathlib import Path
 import configparser
-import importlib.metadata
+import logging as log
 import os
 
-from prettytable import PrettyTable
-
-
 __appname__ = "octsegmenter"
 
 # Semantic Versioning 2.0.0: https://semver.org/
@@ -19,66 +17,145 @@ os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
 
 MODELS_DIR = Path(os.path.dirname(os.path.abspath(__file__)) + "/data/models/")
 CONFIG_FILE_PATH = Path.home() / Path(".oct-segmenter/config")
+MODELS_INDEX_DIR = Path.home() / Path(".oct-segmenter/models-index")
+ANNOTATION_CACHE_DIR = Path.home() / Path(".oct-segmenter/annotation-cache")
+IMAGE_CACHE_DIR = Path.home() / Path(".oct-segmenter/image-cache")
+
+"""
+The config file and the models table are loaded the first time they are
+needed (see 'get_config()' and 'get_models_table()') instead of when the
+package is imported. The module level names 'CONFIG', 'DEFAULT_MODEL_NAME',
+'MODELS_TABLE', 'MODELS_TABLE_ASCII', 'MODELS_INDEX_MAP' and
+'DEFAULT_MODEL_INDEX' are still available and resolved on first access.
+"""
 
 
-def load_models_table():
+def load_models_table(refresh: bool = False):
     """
     The conventions in this functions are:
     1. The name of the model shown is the name of its relative path starting
     from data/model
     2. Each directory must contain at most 1 model
     3. The model name must start with "model*" and end with "*.hdf5"
+
+    The models are read from the persisted registry index (see
+    'oct_segmenter.common.models_registry'), which is only rebuilt when the
+    models directory changes or 'refresh' is True.
     """
+    from prettytable import PrettyTable
 
-    models = {}
-    for subdir, dirs, files in os.walk(MODELS_DIR):
-        for file in files:
-            if file.startswith("model") and file.endswith(".hdf5"):
-                models[str(Path(subdir).relative_to(MODELS_DIR))] = Path(
-                    os.path.join(subdir, file)
-                )
+    from oct_segmenter.common.models_registry import (
+        load_models_index,
+        models_index_path,
+    )
 
+    models = {}
+    default_model_name = get_default_model_name()
     models_ascii = PrettyTable()  # Build models ascii table for listing
-    models_ascii.field_names = ["Default", "Selection", "Model Name"]
+    models_ascii.field_names = [
+        "Default",
+        "Selection",
+        "Model Name",
+        "Size (MB)",
+        "Input Shape",
+    ]
     default_model_index = None
     models_index_map = {}  # Maps index -> model names
-    for i, model_name in enumerate(models.keys()):
+    index_path = models_index_path(MODELS_DIR, MODELS_INDEX_DIR)
+    for entry in load_models_index(MODELS_DIR, index_path, refresh):
+        i, model_name = entry["index"], entry["name"]
+        models[model_name] = Path(entry["path"])
         models_index_map[i] = model_name
-        if DEFAULT_MODEL_NAME == model_name:
+        is_default = default_model_name == model_name
+        if is_default:
             default_model_index = i
-            models_ascii.add_row(["*", i, model_name])
-        else:
-            models_ascii.add_row(["", i, model_name])
+        models_ascii.add_row(
+            [
+                "*" if is_default else "",
+                i,
+                model_name,
+                f"{entry['size'] / 2**20:.1f}",
+                entry["input_shape"],
+            ]
+        )
 
     return models, models_ascii, models_index_map, default_model_index
 
 
+def create_default_config() -> configparser.ConfigParser:
+    config = configparser.ConfigParser()
+    config["DEFAULT"] = {"model_dir": "visual-function-core"}
+    config["User"] = {}
+    return config
+
+
 def write_default_config():
     if not CONFIG_FILE_PATH.is_file():
-        config = configparser.ConfigParser()
-        config["DEFAULT"] = {"model_dir": "visual-function-core"}
-        config["User"] = {}
-
-        os.makedirs(CONFIG_FILE_PATH.parent, exist_ok=True)
-        with open(CONFIG_FILE_PATH, "w") as config_file:
-            config.write(config_file)
+        try:
+            os.makedirs(CONFIG_FILE_PATH.parent, exist_ok=True)
+            with open(CONFIG_FILE_PATH, "w") as config_file:
+                create_default_config().write(config_file)
+        except OSError as e:
+            # e.g. read-only or shared HOME directories. The defaults are used.
+            log.warning(f"Could not write default config file: {e}")
 
 
 def load_config() -> configparser.ConfigParser:
-    config = configparser.ConfigParser()
+    config = create_default_config()
     config.read(CONFIG_FILE_PATH)
     return config
 
 
-write_default_config()
-CONFIG = load_config()
-DEFAULT_MODEL_NAME = CONFIG.get("User", "model_dir")
-(
-    MODELS_TABLE,
-    MODELS_TABLE_ASCII,
-    MODELS_INDEX_MAP,
-    DEFAULT_MODEL_INDEX,
-) = load_models_table()
+@lru_cache(maxsize=None)
+def get_config() -> configparser.ConfigParser:
+    write_default_config()
+    return load_config()
+
+
+def get_default_model_name() -> str:
+    return get_config().get("User", "model_dir")
+
+
+def get_max_cached_models() -> int:
+    return get_config().getint(
+        "User", "max_cached_models", fallback=DEFAULT_MAX_CACHED_MODELS
+    )
+
+
+def get_max_image_cache_size() -> int:
+    """
+    Returns the size cap of the decoded image cache in MB. 0 (the default)
+    disables it.
+    """
+    return get_config().getint(
+        "User", "max_image_cache_size", fallback=DEFAULT_MAX_IMAGE_CACHE_SIZE
+    )
+
+
+@lru_cache(maxsize=None)
+def get_models_table():
+    """
+    Returns the tuple: (models table, models ascii table, models index map,
+    default model index). See 'load_models_table()'.
+    """
+    return load_models_table()
+
+
+_LAZY_ATTRIBUTES = {
+    "CONFIG": get_config,
+    "DEFAULT_MODEL_NAME": get_default_model_name,
+    "MODELS_TABLE": lambda: get_models_table()[0],
+    "MODELS_TABLE_ASCII": lambda: get_models_table()[1],
+    "MODELS_INDEX_MAP": lambda: get_models_table()[2],
+    "DEFAULT_MODEL_INDEX": lambda: get_models_table()[3],
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 DEFAULT_TEST_PARTITION = 0.3
 DEFAULT_TRAINING_PARTITION = round(0.8 * (1 - DEFAULT_TEST_PARTITION), 2)
@@ -86,6 +163,22 @@ DEFAULT_VALIDATION_PARTITION = round(0.2 * (1 - DEFAULT_TEST_PARTITION), 2)
 
 DEFAULT_MLFLOW_TRACKING_URI = None
 
+DEFAULT_CHUNK_SIZE = 16  # Images per HDF5 chunk when generating datasets
+DATASET_LAYOUTS = ["contiguous", "chunked"]
+DATASET_COMPRESSIONS = ["lzf", "gzip"]
+DEFAULT_LABEL_COMPRESSION = "gzip"
+LABEL_ENCODINGS = ["map", "boundaries"]
+
+DEFAULT_DECODE_THREADS = 4
+DEFAULT_DISCOVERY_THREADS = 8  # Directories scanned in parallel
+DEFAULT_PREFETCH = 16
+
+DEFAULT_MAX_CACHED_MODELS = 2  # Loaded models kept in memory per process
+DEFAULT_MAX_IMAGE_CACHE_SIZE = 0  # MB of decoded images kept on disk (0: off)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8700
+
 WAYNE_STATE_LAYER_NAMES = [
     "RNFL-vitreous",
     "GCL-RNFL",
@@ -3,19 +3,22 @@ import art
 import logging as log
 
 from oct_segmenter import (
+    DATASET_COMPRESSIONS,
+    DATASET_LAYOUTS,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_DECODE_THREADS,
+    DEFAULT_HOST,
+    DEFAULT_PORT,
+    DEFAULT_PREFETCH,
     DEFAULT_TRAINING_PARTITION,
     DEFAULT_TEST_PARTITION,
     DEFAULT_VALIDATION_PARTITION,
+    LABEL_ENCODINGS,
 )
-from oct_segmenter.commands.evaluate import evaluate
-from oct_segmenter.commands.generate import (
-    generate_training_dataset,
-    generate_test_dataset,
-)
-from oct_segmenter.commands.label import label
-from oct_segmenter.commands.partition import partition
-from oct_segmenter.commands.predict import predict
-from oct_segmenter.commands.train import train
+
+# The command modules are imported when their subcommand is dispatched so
+# that light subcommands (and '--help') do not pay for importing TensorFlow
+# and the model library.
 
 
 def main():
@@ -104,6 +107,78 @@ def main():
         default=".",
     )
 
+    gen_test_parser.add_argument(
+        "--streaming",
+        default=False,
+        action="store_true",
+        help="Append each labeled image to the HDF5 file as it is produced "
+        "instead of keeping the whole dataset in memory",
+    )
+
+    gen_test_parser.add_argument(
+        "--chunk-size",
+        default=DEFAULT_CHUNK_SIZE,
+        type=int,
+        help="Number of images per HDF5 chunk of chunked datasets",
+    )
+
+    gen_test_parser.add_argument(
+        "--workers",
+        default=1,
+        type=int,
+        help="Number of processes used to label the input files",
+    )
+
+    gen_test_parser.add_argument(
+        "--no-annotation-cache",
+        default=False,
+        action="store_true",
+        help="Parse the CSV annotations again instead of reusing the binary "
+        "copies cached in '~/.oct-segmenter/annotation-cache'",
+    )
+
+    gen_test_parser.add_argument(
+        "--incremental",
+        default=False,
+        action="store_true",
+        help="Update an existing dataset file: only label the input files that "
+        "were added or changed since it was generated and drop the removed ones",
+    )
+
+    gen_test_parser.add_argument(
+        "--layout",
+        choices=DATASET_LAYOUTS,
+        default=None,
+        help="Storage of the images: 'contiguous' (default, uncompressed in one "
+        "block) or 'chunked' (chunks of '--chunk-size' images, always used with "
+        "'--streaming' and '--incremental')",
+    )
+
+    gen_test_parser.add_argument(
+        "--compression",
+        choices=DATASET_COMPRESSIONS,
+        default=None,
+        help="Compress the images (implies '--layout chunked') and the labels "
+        "with this HDF5 filter. The labels are compressed with gzip by default "
+        "unless '--layout contiguous' is passed",
+    )
+
+    gen_test_parser.add_argument(
+        "--label-encoding",
+        choices=LABEL_ENCODINGS,
+        default="map",
+        help="Store the labels as segmentation maps (default) or only the "
+        "boundaries of the layers, from which the maps are rebuilt when read",
+    )
+
+    gen_test_parser.add_argument(
+        "--manifest",
+        default=None,
+        help="Manifest file listing the input files. It is written on the "
+        "first run and reused on the next ones instead of walking the input "
+        "directories again, unless they or the files changed",
+    )
+
     # Generate training dataset
     gen_train_parser = generate_subparser.add_parser("training")
     gen_train_parser.add_argument(
@@ -179,6 +254,78 @@ def main():
         "-o", "--output-dir", help="Name of the output name file", default="."
     )
 
+    gen_train_parser.add_argument(
+        "--streaming",
+        default=False,
+        action="store_true",
+        help="Append each labeled image to the HDF5 file as it is produced "
+        "instead of keeping the whole dataset in memory",
+    )
+
+    gen_train_parser.add_argument(
+        "--chunk-size",
+        default=DEFAULT_CHUNK_SIZE,
+        type=int,
+        help="Number of images per HDF5 chunk of chunked datasets",
+    )
+
+    gen_train_parser.add_argument(
+        "--workers",
+        default=1,
+        type=int,
+        help="Number of processes used to label the input files",
+    )
+
+    gen_train_parser.add_argument(
+        "--no-annotation-cache",
+        default=False,
+        action="store_true",
+        help="Parse the CSV annotations again instead of reusing the binary "
+        "copies cached in '~/.oct-segmenter/annotation-cache'",
+    )
+
+    gen_train_parser.add_argument(
+        "--incremental",
+        default=False,
+        action="store_true",
+        help="Update an existing dataset file: only label the input files that "
+        "were added or changed since it was generated and drop the removed ones",
+    )
+
+    gen_train_parser.add_argument(
+        "--layout",
+        choices=DATASET_LAYOUTS,
+        default=None,
+        help="Storage of the images: 'contiguous' (default, uncompressed in one "
+        "block) or 'chunked' (chunks of '--chunk-size' images, always used with "
+        "'--streaming' and '--incremental')",
+    )
+
+    gen_train_parser.add_argument(
+        "--compression",
+        choices=DATASET_COMPRESSIONS,
+        default=None,
+        help="Compress the images (implies '--layout chunked') and the labels "
+        "with this HDF5 filter. The labels are compressed with gzip by default "
+        "unless '--layout contiguous' is passed",
+    )
+
+    gen_train_parser.add_argument(
+        "--label-encoding",
+        choices=LABEL_ENCODINGS,
+        default="map",
+        help="Store the labels as segmentation maps (default) or only the "
+        "boundaries of the layers, from which the maps are rebuilt when read",
+    )
+
+    gen_train_parser.add_argument(
+        "--manifest",
+        default=None,
+        help="Manifest file listing the input files. It is written on the "
+        "first run and reused on the next ones instead of walking the input "
+        "directories again, unless they or the files changed",
+    )
+
     # Train
     train_subparser = cmd_subparser.add_parser("train")
     train_subparser.add_argument(
@@ -259,6 +406,14 @@ def main():
         default=DEFAULT_TEST_PARTITION,
     )
 
+    partition_subparser.add_argument(
+        "--manifest",
+        default=None,
+        help="Manifest file listing the input files. It is written on the "
+        "first run and reused on the next ones instead of walking the input "
+        "directories again, unless they or the files changed",
+    )
+
     # Predict
     predict_subparser = cmd_subparser.add_parser("predict")
     predict_input_group = predict_subparser.add_mutually_exclusive_group(required=True)
@@ -308,6 +463,40 @@ def main():
         help="Spacing between layer annotations in LabelMe JSON file",
     )
 
+    predict_subparser.add_argument(
+        "--batch-size",
+        "-b",
+        default=None,
+        type=int,
+        help="Read, predict and save the images in batches of this size "
+        "instead of loading all of them at once",
+    )
+
+    predict_subparser.add_argument(
+        "--prefetch",
+        default=DEFAULT_PREFETCH,
+        type=int,
+        help="Number of upcoming images decoded in the background while the "
+        "model runs. Use 0 to decode images on the main thread "
+        f"(default: {DEFAULT_PREFETCH})",
+    )
+
+    predict_subparser.add_argument(
+        "--decode-threads",
+        default=DEFAULT_DECODE_THREADS,
+        type=int,
+        help="Number of threads used to decode prefetched images "
+        f"(default: {DEFAULT_DECODE_THREADS})",
+    )
+
+    predict_subparser.add_argument(
+        "--manifest",
+        default=None,
+        help="Manifest file listing the input files. It is written on the "
+        "first run and reused on the next ones instead of walking the input "
+        "directories again, unless they or the files changed",
+    )
+
     # Evaluate
     evaluate_subparser = cmd_subparser.add_parser("evaluate")
 
@@ -347,6 +536,89 @@ def main():
         help="Path to JSON config file",
     )
 
+    # Models
+    models_subparser = cmd_subparser.add_parser(
+        "models", help="List the installed models and their selection index"
+    )
+    models_cmd_subparser = models_subparser.add_subparsers(dest="models", required=True)
+    models_cmd_subparser.add_parser(
+        "list", help="List the models in the (cached) models registry"
+    )
+    models_cmd_subparser.add_parser(
+        "refresh",
+        help="Rescan the models directory and recompute the models' hashes",
+    )
+
+    # Cache
+    cache_subparser = cmd_subparser.add_parser(
+        "cache", help="Inspect or clear the decoded image and annotation caches"
+    )
+    cache_cmd_subparser = cache_subparser.add_subparsers(dest="cache", required=True)
+    cache_cmd_subparser.add_parser(
+        "stats", help="Show the number and size of the cached images and annotations"
+    )
+    cache_cmd_subparser.add_parser(
+        "clear", help="Remove the cached images and annotations"
+    )
+
+    # Serve
+    serve_subparser = cmd_subparser.add_parser(
+        "serve",
+        help="Load the model once and serve predictions over HTTP",
+    )
+
+    serve_model_group = serve_subparser.add_mutually_exclusive_group(required=False)
+
+    serve_model_group.add_argument(
+        "--model-path",
+        "-m",
+        help="Path to model to use for prediction (HDF5 file).",
+        type=str,
+    )
+
+    serve_model_group.add_argument(
+        "--mlflow-run-uuid",
+        "-r",
+        help="UUID of the run that generated the model",
+        type=str,
+    )
+
+    serve_subparser.add_argument(
+        "-c",
+        "--config",
+        help="Path to JSON config file",
+    )
+
+    serve_subparser.add_argument(
+        "--host",
+        default=DEFAULT_HOST,
+        help=f"Address to listen on (default: {DEFAULT_HOST})",
+    )
+
+    serve_subparser.add_argument(
+        "--port",
+        "-p",
+        default=DEFAULT_PORT,
+        type=int,
+        help=f"Port to listen on (default: {DEFAULT_PORT})",
+    )
+
+    serve_subparser.add_argument(
+        "--spacing",
+        "-s",
+        default=20,
+        type=int,
+        help="Spacing between layer annotations in LabelMe JSON responses",
+    )
+
+    serve_subparser.add_argument(
+        "--warmup-image",
+        "-w",
+        default=None,
+        help="Image to segment at startup so that the model is loaded before "
+        "the first request",
+    )
+
     # Generate labelme files from raw image and boundaries CSV file
     label_subparser = cmd_subparser.add_parser("label")
     label_input_group = label_subparser.add_mutually_exclusive_group(required=True)
@@ -364,9 +636,22 @@ def main():
         help="Output directory",
     )
 
+    label_subparser.add_argument(
+        "--manifest",
+        default=None,
+        help="Manifest file listing the input files. It is written on the "
+        "first run and reused on the next ones instead of walking the input "
+        "directories again, unless they or the files changed",
+    )
+
     args = parser.parse_args()
 
     if args.command == "generate":
+        from oct_segmenter.commands.generate import (
+            generate_training_dataset,
+            generate_test_dataset,
+        )
+
         if args.labelme_format and args.layers_format is None:
             log.error(
                 "If generating images from 'labelme' files specify the layer "
@@ -385,14 +670,36 @@ def main():
             exit(1)
 
     elif args.command == "partition":
+        from oct_segmenter.commands.partition import partition
+
         partition(args)
     elif args.command == "predict":
+        from oct_segmenter.commands.predict import predict
+
         predict(args)
     elif args.command == "evaluate":
+        from oct_segmenter.commands.evaluate import evaluate
+
         evaluate(args)
     elif args.command == "label":
+        from oct_segmenter.commands.label import label
+
         label(args)
+    elif args.command == "models":
+        from oct_segmenter.commands.models import models
+
+        models(args)
+    elif args.command == "cache":
+        from oct_segmenter.commands.cache import cache
+
+        cache(args)
+    elif args.command == "serve":
+        from oct_segmenter.commands.serve import serve
+
+        serve(args)
     elif args.command == "train":
+        from oct_segmenter.commands.train import train
+
         train(args)
 
 
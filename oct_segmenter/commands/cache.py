@@ -0,0 +1,34 @@
+import shutil
+
+from oct_segmenter import (
+    ANNOTATION_CACHE_DIR,
+    IMAGE_CACHE_DIR,
+    get_max_image_cache_size,
+)
+from oct_segmenter.common.image_cache import cache_usage
+
+
+def cache(args):
+    if args.cache == "clear":
+        for cache_dir in (IMAGE_CACHE_DIR, ANNOTATION_CACHE_DIR):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            print(f"Removed: {cache_dir}")
+        return
+
+    num_images, images_size = cache_usage(IMAGE_CACHE_DIR)
+    max_size = get_max_image_cache_size()
+    print(f"Image cache: {IMAGE_CACHE_DIR}")
+    if max_size <= 0:
+        print("  Disabled (set 'max_image_cache_size' in the config file)")
+    print(f"  Images: {num_images}")
+    print(f"  Size: {images_size / 2**20:.1f} MB (max: {max_size} MB)")
+
+    annotations = (
+        list(ANNOTATION_CACHE_DIR.glob("*.npz"))
+        if ANNOTATION_CACHE_DIR.is_dir()
+        else []
+    )
+    annotations_size = sum(path.stat().st_size for path in annotations)
+    print(f"Annotation cache: {ANNOTATION_CACHE_DIR}")
+    print(f"  Annotations: {len(annotations)}")
+    print(f"  Size: {annotations_size / 2**20:.1f} MB")
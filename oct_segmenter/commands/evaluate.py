@@ -2,6 +2,7 @@ import os
 
 import json
 import logging as log
+import tempfile
 from pathlib import Path
 
 from oct_image_segmentation_models.evaluation import evaluation
@@ -12,9 +13,16 @@ from oct_image_segmentation_models.evaluation.evaluation_parameters import (
 
 from oct_segmenter import (
     DEFAULT_MLFLOW_TRACKING_URI,
-    MODELS_TABLE,
-    MODELS_INDEX_MAP,
+    get_models_table,
 )
+from oct_segmenter.common.model_cache import install_model_cache
+from oct_segmenter.preprocessing.hdf5_reader import (
+    check_dataset_file,
+    decode_label_boundaries,
+)
+
+# Loading a model again in this process returns the already loaded one
+install_model_cache()
 
 DEFAULT_GRAPH_SEARCH = True
 DEFAULT_METRICS = ["dice"]
@@ -41,16 +49,16 @@ def evaluate(args):
             )
             exit(1)
 
-        number_of_models = len(MODELS_INDEX_MAP)
-        if args.model_index >= number_of_models:
+        models_table, _, models_index_map, _ = get_models_table()
+        if args.model_index not in models_index_map:
             print(
-                f"Please select an index model from 0 to "
-                f"{number_of_models - 1}. Exiting..."
+                "Please select one of the model indices listed by "
+                "'oct-segmenter models list'. Exiting..."
             )
             exit(1)
 
-        model_name = MODELS_INDEX_MAP[args.model_index]
-        model_path = MODELS_TABLE[model_name]
+        model_name = models_index_map[args.model_index]
+        model_path = models_table[model_name]
 
     log.info(f"Using model: {model_name}")
 
@@ -60,6 +68,10 @@ def evaluate(args):
         print("oct-segmenter: Test Dataset file not found. Exiting...")
         exit(1)
 
+    check_dataset_file(
+        test_dataset_path, [("test_images", "test_labels")], "Test dataset"
+    )
+
     output_dir = Path(args.output_dir)
     if not output_dir.is_dir():
         print("oct-segmenter: Output directory not found. Exiting...")
@@ -83,30 +95,36 @@ def evaluate(args):
                 DEFAULT_METRICS,
             )
 
-    log.info(f"Evaluation Parameter: Graph Search: {graph_search}")
-    log.info(f"Evaluation Parameter: Metrics: {metrics}")
-
-    save_params = EvaluationSaveParams(
-        predicted_labels=True,
-        categorical_pred=False,
-        png_images=True,
-        boundary_maps=True,
-    )
-
-    eval_params = EvaluationParameters(
-        model_path=model_path,
-        mlflow_tracking_uri=mlflow_tracking_uri,
-        mlflow_run_uuid=args.mlflow_run_uuid,
-        test_dataset_path=test_dataset_path,
-        save_foldername=output_dir.absolute(),
-        save_params=save_params,
-        graph_search=graph_search,
-        metrics=metrics,
-        gsgrad=1,
-        dice_errors=True,
-        binarize=True,
-        bg_ilm=True,
-        bg_csi=False,
-    )
-
-    evaluation.evaluate_model(eval_params)
+    # The model library reads the segmentation maps straight from the file
+    with tempfile.TemporaryDirectory(prefix="oct-segmenter-") as decoded_dir:
+        test_dataset_path = decode_label_boundaries(
+            test_dataset_path, ["test_labels"], Path(decoded_dir)
+        )
+
+        log.info(f"Evaluation Parameter: Graph Search: {graph_search}")
+        log.info(f"Evaluation Parameter: Metrics: {metrics}")
+
+        save_params = EvaluationSaveParams(
+            predicted_labels=True,
+            categorical_pred=False,
+            png_images=True,
+            boundary_maps=True,
+        )
+
+        eval_params = EvaluationParameters(
+            model_path=model_path,
+            mlflow_tracking_uri=mlflow_tracking_uri,
+            mlflow_run_uuid=args.mlflow_run_uuid,
+            test_dataset_path=test_dataset_path,
+            save_foldername=output_dir.absolute(),
+            save_params=save_params,
+            graph_search=graph_search,
+            metrics=metrics,
+            gsgrad=1,
+            dice_errors=True,
+            binarize=True,
+            bg_ilm=True,
+            bg_csi=False,
+        )
+
+        evaluation.evaluate_model(eval_params)
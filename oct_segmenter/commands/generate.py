@@ -68,6 +68,15 @@ def generate_training_dataset(args):
         input_format=input_format,
         rgb_format=args.rgb,
         layer_names=layer_names,
+        streaming=args.streaming,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        annotation_cache=not args.no_annotation_cache,
+        incremental=args.incremental,
+        layout=args.layout,
+        compression=args.compression,
+        label_encoding=args.label_encoding,
+        manifest=Path(args.manifest) if args.manifest else None,
     )
     dataset.close()
 
@@ -96,6 +105,15 @@ def generate_test_dataset(args):
         input_format=input_format,
         rgb_format=args.rgb,
         layer_names=layer_names,
+        streaming=args.streaming,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        annotation_cache=not args.no_annotation_cache,
+        incremental=args.incremental,
+        layout=args.layout,
+        compression=args.compression,
+        label_encoding=args.label_encoding,
+        manifest=Path(args.manifest) if args.manifest else None,
     )
 
     dataset.close()
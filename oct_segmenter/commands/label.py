@@ -1,37 +1,33 @@
-import os
-
 import logging as log
 import json
-import numpy as np
 from pathlib import Path
-from PIL import Image
 
+from oct_segmenter.common.csv_reader import CSVParseError, read_csv
+from oct_segmenter.common.file_discovery import find_input_entries
+from oct_segmenter.common.image_cache import read_image
 from oct_segmenter.postprocessing.postprocessing import (
     create_labelme_file_from_boundaries,
 )
 
 
 def label(args):
-    input_paths = []
+    input_entries = []
     if args.input:
         input_path = Path(args.input)
         input_dir = input_path.parent
         if not input_path.is_file():
             print("oct-segmenter: Input file not found. Exiting...")
             exit(1)
-        input_paths.append(input_path)
+        csv_path = input_path.parent / Path(input_path.stem + ".csv")
+        input_entries.append({"path": input_path, "csv": csv_path.is_file()})
     elif args.input_dir:
         input_dir = Path(args.input_dir)
         if not input_dir.is_dir():
             print("oct-segmenter: Input directory not found. Exiting...")
             exit(1)
 
-        for subdir, _, files in os.walk(args.input_dir):
-            for file in files:
-                if (
-                    file.endswith(".tiff") or file.endswith(".TIFF")
-                ) and not file.startswith("."):
-                    input_paths.append(Path(os.path.join(subdir, file)))
+        manifest = Path(args.manifest) if args.manifest else None
+        input_entries = find_input_entries(input_dir, ".tiff", manifest)
     else:
         print(
             "oct-segmenter: No input image file or directory were provided. Exiting..."
@@ -43,15 +39,21 @@ def label(args):
         print("oct-segmenter: Output directory not found. Exiting...")
         exit(1)
 
-    for input_path in input_paths:
+    for entry in input_entries:
+        input_path = Path(entry["path"])
         log.info(f"Generating 'labelme' file for image: {input_path}")
         boundaries_path = Path(input_path.parent) / Path(input_path.stem + ".csv")
-        if not boundaries_path.is_file():
+        if not entry["csv"]:
             log.warn(f"Boundaries file '{boundaries_path}' not found. Skipping...")
             continue
 
-        img_arr = np.array(Image.open(input_path))
-        boundaries = np.genfromtxt(boundaries_path, delimiter=",")
+        try:
+            boundaries = read_csv(boundaries_path, dtype=float)
+        except CSVParseError as e:
+            log.warn(f"Failed to parse boundaries file. {e}. Skipping...")
+            continue
+
+        img_arr = read_image(input_path)
 
         labelme_data = create_labelme_file_from_boundaries(
             img_arr, input_path, boundaries
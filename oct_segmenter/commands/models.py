@@ -0,0 +1,11 @@
+from oct_segmenter import MODELS_DIR, get_models_table, load_models_table
+
+
+def models(args):
+    if args.models == "refresh":
+        _, models_ascii, _, _ = load_models_table(refresh=True)
+    else:
+        _, models_ascii, _, _ = get_models_table()
+
+    print(f"Models directory: {MODELS_DIR}")
+    print(models_ascii)
@@ -6,6 +6,8 @@ import logging
 import numpy as np
 from pathlib import Path
 
+from oct_segmenter.common.file_discovery import find_input_files
+
 
 def copy_json(i, image_paths, permutation, dst_path):
     name = image_paths[permutation[i]].name
@@ -58,13 +60,8 @@ def partition(args):
     if args.j:
         extension = ".json"
 
-    image_paths = []
-    for subdir, dirs, files in os.walk(input_dir):
-        for file in files:
-            if (
-                file.endswith(extension) or file.endswith(extension.upper())
-            ) and not file.startswith("."):
-                image_paths.append(Path(os.path.join(subdir, file)))
+    manifest = Path(args.manifest) if args.manifest else None
+    image_paths = find_input_files(Path(input_dir), extension, manifest)
 
     logging.info(f"Found {len(image_paths)} images")
 
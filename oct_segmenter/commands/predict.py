@@ -1,9 +1,13 @@
+import itertools
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import json
 import logging as log
 import numpy as np
 from pathlib import Path, PurePosixPath
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
 
 from oct_image_segmentation_models.common.dataset import Dataset
 from oct_image_segmentation_models.prediction import prediction
@@ -13,20 +17,30 @@ from oct_image_segmentation_models.prediction.prediction_parameters import (
 )
 
 from oct_segmenter import (
+    DEFAULT_DECODE_THREADS,
     DEFAULT_MLFLOW_TRACKING_URI,
-    MODELS_TABLE,
-    MODELS_INDEX_MAP,
+    DEFAULT_PREFETCH,
+    get_models_table,
 )
+from oct_segmenter.common.file_discovery import find_input_files
+from oct_segmenter.common.model_cache import MODEL_CACHE, install_model_cache
 from oct_segmenter.preprocessing import preprocess
 from oct_segmenter.postprocessing.postprocessing import (
     create_labelme_file_from_boundaries,
 )
 
+# Loading a model again in this process returns the already loaded one
+install_model_cache()
+
 DEFAULT_GRAPH_SEARCH = False
 DEFAULT_ANNOTATED_LABELME_FILE = False
 
 
-def predict(args):
+def resolve_model(args):
+    """
+    Returns the tuple: (model path, model name, MLflow tracking URI) of the
+    model selected in the command line arguments.
+    """
     mlflow_tracking_uri = DEFAULT_MLFLOW_TRACKING_URI
 
     if args.model_path:
@@ -40,23 +54,30 @@ def predict(args):
         model_name = str(mlflow_tracking_uri) + "/" + str(model_path)
     else:
         # Check selected model is valid
-        if args.model_index is None:
+        model_index = getattr(args, "model_index", None)
+        if model_index is None:
             print(
                 "oct-segementer: Looks like no model has been loaded. Make "
                 "sure a model exists. Exiting..."
             )
             exit(1)
 
-        number_of_models = len(MODELS_INDEX_MAP)
-        if args.model_index >= number_of_models:
+        models_table, _, models_index_map, _ = get_models_table()
+        if model_index not in models_index_map:
             print(
-                "Please select an index model from 0 to "
-                f"{number_of_models - 1}. Exiting..."
+                "Please select one of the model indices listed by "
+                "'oct-segmenter models list'. Exiting..."
             )
             exit(1)
 
-        model_name = MODELS_INDEX_MAP[args.model_index]
-        model_path = MODELS_TABLE[model_name]
+        model_name = models_index_map[model_index]
+        model_path = models_table[model_name]
+
+    return model_path, model_name, mlflow_tracking_uri
+
+
+def predict(args):
+    model_path, model_name, mlflow_tracking_uri = resolve_model(args)
 
     log.info(f"Using model: {model_name}")
 
@@ -74,12 +95,8 @@ def predict(args):
             print("oct-segmenter: Input directory not found. Exiting...")
             exit(1)
 
-        for subdir, _, files in os.walk(args.input_dir):
-            for file in files:
-                if (
-                    file.endswith(".tiff") or file.endswith(".TIFF")
-                ) and not file.startswith("."):
-                    input_paths.append(Path(os.path.join(subdir, file)))
+        manifest = Path(args.manifest) if args.manifest else None
+        input_paths = find_input_files(input_dir, ".tiff", manifest)
     else:
         print(
             "oct-segmenter: No input image file or directory were provided. "
@@ -95,25 +112,6 @@ def predict(args):
     else:
         root_output_dir = input_dir
 
-    pred_images = []
-    pred_images_names = []
-    output_paths = []
-    for input_path in input_paths:
-        if args.output_dir:
-            output = root_output_dir / input_path.parent.relative_to(input_dir)
-        else:
-            output = input_path.parent
-
-        img = preprocess.generate_input_image(input_path)
-        if img is not None:
-            pred_images.append(img)
-            pred_images_names.append(Path(input_path.name))
-            output_paths.append(output / Path(input_path.stem + "_labeled"))
-
-    if len(pred_images) == 0:
-        log.info("No images were processed successfully. Exiting...")
-        exit(1)
-
     with open(args.config, "r") as f:
         config_data = json.load(f)
         graph_search = config_data.get("graph_search", DEFAULT_GRAPH_SEARCH)
@@ -124,27 +122,146 @@ def predict(args):
 
     log.info(f"Prediction Parameter: Graph Search: {graph_search}")
 
-    pred_images = np.array(pred_images)
-    dataset = Dataset(
-        images=pred_images,
-        image_masks=None,
-        image_names=pred_images_names,
-        image_output_dirs=output_paths,
+    batch_size = args.batch_size
+    if batch_size is not None and batch_size < 1:
+        print("oct-segmenter: Batch size must be a positive integer. Exiting...")
+        exit(1)
+
+    if args.decode_threads < 1 or args.prefetch < 0:
+        print(
+            "oct-segmenter: The number of decode threads must be positive and "
+            "the prefetch depth non-negative. Exiting..."
+        )
+        exit(1)
+
+    input_images = iter_input_images(
+        input_paths,
+        input_dir,
+        root_output_dir if args.output_dir else None,
+        decode_threads=args.decode_threads,
+        prefetch=args.prefetch,
     )
 
-    save_params = PredictionSaveParams(
-        predicted_labels=True,
-        categorical_pred=False,
-        png_images=True,
-        boundary_maps=True,
+    processed_images = 0
+    # The model is loaded by the first batch and reused by the next ones
+    with MODEL_CACHE.hold():
+        for batch in iter_batches(input_images, batch_size):
+            predict_batch(
+                batch,
+                model_path=model_path,
+                mlflow_tracking_uri=mlflow_tracking_uri,
+                mlflow_run_uuid=args.mlflow_run_uuid,
+                config_output_dir=root_output_dir,
+                graph_search=graph_search,
+                annotated_labelme_file=annotated_labelme_file,
+                spacing=args.spacing,
+            )
+            processed_images += len(batch)
+            log.info(f"Processed {processed_images}/{len(input_paths)} images")
+
+    if processed_images == 0:
+        log.info("No images were processed successfully. Exiting...")
+        exit(1)
+
+
+def iter_input_images(
+    input_paths: List[Path],
+    input_dir: Path,
+    root_output_dir: Optional[Path],
+    decode_threads: int = DEFAULT_DECODE_THREADS,
+    prefetch: int = DEFAULT_PREFETCH,
+) -> Iterator[Tuple[np.ndarray, Path, Path]]:
+    """
+    Reads the input images and yields a tuple: (image, image name, output
+    path) for each of them, in the same order as 'input_paths'. Images that
+    cannot be read are skipped. If 'root_output_dir' is None the outputs are
+    placed next to the input image.
+
+    When 'prefetch' is greater than 0, up to 'prefetch' upcoming images are
+    decoded in the background by a pool of 'decode_threads' threads, so that
+    reading the next images overlaps with the prediction of the current batch.
+    """
+
+    def output_path(input_path: Path) -> Path:
+        if root_output_dir is not None:
+            output = root_output_dir / input_path.parent.relative_to(input_dir)
+        else:
+            output = input_path.parent
+
+        return output / Path(input_path.stem + "_labeled")
+
+    if prefetch == 0:
+        for input_path in input_paths:
+            img = preprocess.generate_input_image(input_path)
+            if img is not None:
+                yield img, Path(input_path.name), output_path(input_path)
+        return
+
+    with ThreadPoolExecutor(max_workers=decode_threads) as executor:
+        pending = deque()
+        input_paths_iter = iter(input_paths)
+        for input_path in itertools.islice(input_paths_iter, prefetch):
+            pending.append(
+                (
+                    input_path,
+                    executor.submit(preprocess.generate_input_image, input_path),
+                )
+            )
+
+        while pending:
+            input_path, future = pending.popleft()
+            next_path = next(input_paths_iter, None)
+            if next_path is not None:
+                pending.append(
+                    (
+                        next_path,
+                        executor.submit(preprocess.generate_input_image, next_path),
+                    )
+                )
+
+            img = future.result()
+            if img is not None:
+                yield img, Path(input_path.name), output_path(input_path)
+
+
+def iter_batches(iterable: Iterable, batch_size: Optional[int]) -> Iterator[List]:
+    """
+    Groups the elements of 'iterable' in lists of 'batch_size' elements (the
+    last one can be shorter). If 'batch_size' is None a single list with all
+    the elements is yielded.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def run_prediction(
+    images: np.ndarray,
+    image_names: List[Path],
+    output_dirs: List[Path],
+    model_path: Union[Path, PurePosixPath],
+    mlflow_tracking_uri,
+    mlflow_run_uuid: Optional[str],
+    config_output_dir: Path,
+    graph_search: bool,
+    save_params: PredictionSaveParams,
+):
+    dataset = Dataset(
+        images=images,
+        image_masks=None,
+        image_names=image_names,
+        image_output_dirs=output_dirs,
     )
 
     predict_params = PredictionParams(
         model_path=model_path,
         mlflow_tracking_uri=mlflow_tracking_uri,
-        mlflow_run_uuid=args.mlflow_run_uuid,
+        mlflow_run_uuid=mlflow_run_uuid,
         dataset=dataset,
-        config_output_dir=root_output_dir,
+        config_output_dir=config_output_dir,
         save_params=save_params,
         graph_search=graph_search,
         trim_maps=False,
@@ -153,12 +270,44 @@ def predict(args):
         col_error_range=None,
     )
 
+    return prediction.predict(predict_params)
+
+
+def predict_batch(
+    batch: List[Tuple[np.ndarray, Path, Path]],
+    model_path: Union[Path, PurePosixPath],
+    mlflow_tracking_uri,
+    mlflow_run_uuid: Optional[str],
+    config_output_dir: Path,
+    graph_search: bool,
+    annotated_labelme_file: bool,
+    spacing: int,
+):
+    pred_images, pred_images_names, output_paths = zip(*batch)
+
+    save_params = PredictionSaveParams(
+        predicted_labels=True,
+        categorical_pred=False,
+        png_images=True,
+        boundary_maps=True,
+    )
+
     # Create output dirs
     for output_path in output_paths:
         if not os.path.exists(output_path):
             os.makedirs(output_path)
 
-    prediction_outputs = prediction.predict(predict_params)
+    prediction_outputs = run_prediction(
+        np.array(pred_images),
+        list(pred_images_names),
+        list(output_paths),
+        model_path=model_path,
+        mlflow_tracking_uri=mlflow_tracking_uri,
+        mlflow_run_uuid=mlflow_run_uuid,
+        config_output_dir=config_output_dir,
+        graph_search=graph_search,
+        save_params=save_params,
+    )
 
     if annotated_labelme_file:
         for prediction_output in prediction_outputs:
@@ -167,7 +316,7 @@ def predict(args):
                 img_arr=np.squeeze(prediction_output.image),
                 image_name=image_name,
                 boundaries=prediction_output.gs_pred_segs,
-                spacing=args.spacing,
+                spacing=spacing,
             )
 
             with open(
@@ -0,0 +1,212 @@
+import io
+import json
+import logging as log
+import tempfile
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Dict
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import PIL.Image
+from oct_image_segmentation_models.prediction.prediction_parameters import (
+    PredictionSaveParams,
+)
+
+from oct_segmenter import DEFAULT_HOST, DEFAULT_PORT
+from oct_segmenter.commands.predict import (
+    DEFAULT_GRAPH_SEARCH,
+    resolve_model,
+    run_prediction,
+)
+from oct_segmenter.common.model_cache import MODEL_CACHE, install_model_cache
+from oct_segmenter.preprocessing import preprocess
+from oct_segmenter.preprocessing.image_labeling_common import (
+    boundaries_to_label_map,
+)
+from oct_segmenter.postprocessing.postprocessing import (
+    create_labelme_file_from_boundaries,
+)
+
+# Loading a model again in this process returns the already loaded one
+install_model_cache()
+
+"""
+Request format (POST /predict):
+    - Content-Type 'application/json': {"path": "<path/to/image>", "labelme": bool}
+    - Any other Content-Type: the body contains the image file (e.g. TIFF). The
+      'name' and 'labelme' options can be passed in the query string:
+      /predict?name=myimage.tiff&labelme=true
+
+Response: {"image_name": str, "boundaries": [[...]], "label_map": [[...]],
+           "labelme": {...}}  # 'labelme' only when requested
+"""
+
+
+class Segmenter:
+    """
+    Holds the selected model path and the prediction parameters for the whole
+    lifetime of the server. The model itself is loaded by the first prediction
+    ('warm_up()' or the first request) and then kept in memory by the model
+    cache (see 'common/model_cache.py'), so each request only pays for the
+    prediction.
+    """
+
+    def __init__(
+        self, model_path, mlflow_tracking_uri, mlflow_run_uuid, graph_search, spacing
+    ):
+        self.model_path = model_path
+        self.mlflow_tracking_uri = mlflow_tracking_uri
+        self.mlflow_run_uuid = mlflow_run_uuid
+        self.graph_search = graph_search
+        self.spacing = spacing
+        self.save_params = PredictionSaveParams(
+            predicted_labels=False,
+            categorical_pred=False,
+            png_images=False,
+            boundary_maps=False,
+        )
+
+    def warm_up(self, image_path: Path):
+        """
+        Segments 'image_path' so that the model is loaded before the first
+        request.
+        """
+        img = preprocess.generate_input_image(image_path)
+        if img is None:
+            log.error(f"Could not read warm-up image: {image_path}. Exiting...")
+            exit(1)
+
+        log.info(f"Loading the model with warm-up image: {image_path}")
+        self.segment(img, Path(image_path.name), labelme=False)
+
+    def segment(self, img: np.ndarray, image_name: Path, labelme: bool) -> Dict:
+        with tempfile.TemporaryDirectory() as output_dir:
+            prediction_output = run_prediction(
+                img[np.newaxis, ...],
+                [image_name],
+                [Path(output_dir)],
+                model_path=self.model_path,
+                mlflow_tracking_uri=self.mlflow_tracking_uri,
+                mlflow_run_uuid=self.mlflow_run_uuid,
+                config_output_dir=Path(output_dir),
+                graph_search=self.graph_search,
+                save_params=self.save_params,
+            )[0]
+
+        boundaries = np.asarray(prediction_output.gs_pred_segs)
+        response = {
+            "image_name": str(image_name),
+            "boundaries": boundaries.tolist(),
+            "label_map": boundaries_to_label_map(boundaries, img.shape[0]).tolist(),
+        }
+
+        if labelme:
+            response["labelme"] = create_labelme_file_from_boundaries(
+                img_arr=np.squeeze(prediction_output.image),
+                image_name=image_name,
+                boundaries=boundaries,
+                spacing=self.spacing,
+            )
+
+        return response
+
+
+def make_request_handler(segmenter: Segmenter):
+    class PredictionRequestHandler(BaseHTTPRequestHandler):
+        def send_json(self, status: HTTPStatus, data: Dict):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlparse(self.path).path == "/health":
+                self.send_json(HTTPStatus.OK, {"status": "ok"})
+            else:
+                self.send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != "/predict":
+                self.send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+                return
+
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                if length < 0:
+                    raise ValueError(f"Invalid Content-Length: {length}")
+                body = self.rfile.read(length)
+                img, image_name, labelme = self.read_image_request(url.query, body)
+            except (ValueError, OSError) as e:
+                self.send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+                return
+
+            try:
+                response = segmenter.segment(img, image_name, labelme)
+            except Exception as e:
+                log.exception(f"Prediction failed for image: {image_name}")
+                self.send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+                return
+
+            self.send_json(HTTPStatus.OK, response)
+
+        def read_image_request(self, query: str, body: bytes):
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                request = json.loads(body)
+                if not isinstance(request, dict):
+                    raise ValueError("Request must be a JSON object")
+                if not isinstance(request.get("path"), str):
+                    raise ValueError("Missing 'path' in request")
+                image_path = Path(request["path"])
+                img = preprocess.generate_input_image(image_path)
+                if img is None:
+                    raise ValueError(f"Unsupported image: {image_path}")
+                return img, Path(image_path.name), bool(request.get("labelme"))
+
+            options = parse_qs(query)
+            image_name = Path(options.get("name", ["image.tiff"])[0])
+            labelme = options.get("labelme", ["false"])[0].lower() in ("1", "true")
+            img = preprocess.pil_to_input_image(PIL.Image.open(io.BytesIO(body)))
+            return img, image_name, labelme
+
+    return PredictionRequestHandler
+
+
+def serve(args):
+    model_path, model_name, mlflow_tracking_uri = resolve_model(args)
+    log.info(f"Using model: {model_name}")
+
+    graph_search = DEFAULT_GRAPH_SEARCH
+    if args.config:
+        with open(args.config, "r") as f:
+            config_data = json.load(f)
+            graph_search = config_data.get("graph_search", DEFAULT_GRAPH_SEARCH)
+
+    log.info(f"Prediction Parameter: Graph Search: {graph_search}")
+
+    segmenter = Segmenter(
+        model_path,
+        mlflow_tracking_uri,
+        args.mlflow_run_uuid,
+        graph_search,
+        args.spacing,
+    )
+
+    # Keep the model loaded for the lifetime of the server, even if the model
+    # cache is disabled in the config file
+    with MODEL_CACHE.hold():
+        if args.warmup_image:
+            segmenter.warm_up(Path(args.warmup_image))
+
+        server = HTTPServer((args.host, args.port), make_request_handler(segmenter))
+        log.info(f"Serving predictions on http://{args.host}:{args.port}/predict")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
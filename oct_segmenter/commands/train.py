@@ -1,5 +1,6 @@
 import json
 import logging as log
+import tempfile
 from pathlib import Path
 from tensorflow.keras import optimizers
 
@@ -11,6 +12,11 @@ from oct_image_segmentation_models.training.training_parameters import (
     TrainingParams,
 )
 
+from oct_segmenter.preprocessing.hdf5_reader import (
+    check_dataset_file,
+    decode_label_boundaries,
+)
+
 DEFAULT_AUGMENTATION_MODE = "none"
 DEFAULT_AUGMENTATIONS = []
 DEFAULT_AUGMENT_VALIDATION = False
@@ -113,45 +119,63 @@ def train(args):
     log.info(f"MLFlow Tracking URI: {mlflow_tracking_uri}")
     log.info(f"MLFlow Experiment Name: {mlflow_experiment_name}")
 
-    initial_model = Path(args.model) if args.model else None
+    # Fail before building the model if the dataset is not usable
+    training_dataset_path = Path(args.input).absolute()
+    check_dataset_file(
+        training_dataset_path,
+        [("train_images", "train_labels"), ("val_images", "val_labels")],
+        "Training dataset",
+    )
 
-    try:
-        t_params = TrainingParams(
-            model_architecture=model_architecture,
-            training_dataset_path=Path(args.input).absolute(),
-            initial_model=initial_model,
-            results_location=Path(args.output_dir),
-            opt_con=optimizers.Adam,
-            loss=loss,
-            metric=metric,
-            epochs=epochs,
-            batch_size=batch_size,
-            model_hyperparameters=model_hyperparameters,
-            opt_params={},
-            loss_fn_kwargs=loss_fn_kwargs,
-            augmentations=augmentations,
-            aug_mode=aug_mode,
-            aug_probs=(0.5, 0.5),
-            aug_val=augment_validation,
-            aug_fly=True,
-            model_save_best=True,
-            class_weight=class_weight,
-            early_stopping=early_stopping,
-            restore_best_weights=restore_best_weights,
-            patience=patience,
+    # The model library reads the segmentation maps straight from the file
+    with tempfile.TemporaryDirectory(prefix="oct-segmenter-") as decoded_dir:
+        training_dataset_path = decode_label_boundaries(
+            training_dataset_path, ["train_labels", "val_labels"], Path(decoded_dir)
         )
-    except ValueError as e:
-        log.error(f"Error creating Training Parameters: {e}")
-        exit(1)
 
-    mlflow_params = None if not mlflow_tracking_uri else MLflowParameters(
-        mlflow_tracking_uri,
-        username=mlflow_tracking_username,
-        password=mlflow_tracking_password,
-        experiment=mlflow_experiment_name,
-    )
+        initial_model = Path(args.model) if args.model else None
 
-    training.train_model(
-        t_params,
-        mlflow_params,
-    )
+        try:
+            t_params = TrainingParams(
+                model_architecture=model_architecture,
+                training_dataset_path=training_dataset_path,
+                initial_model=initial_model,
+                results_location=Path(args.output_dir),
+                opt_con=optimizers.Adam,
+                loss=loss,
+                metric=metric,
+                epochs=epochs,
+                batch_size=batch_size,
+                model_hyperparameters=model_hyperparameters,
+                opt_params={},
+                loss_fn_kwargs=loss_fn_kwargs,
+                augmentations=augmentations,
+                aug_mode=aug_mode,
+                aug_probs=(0.5, 0.5),
+                aug_val=augment_validation,
+                aug_fly=True,
+                model_save_best=True,
+                class_weight=class_weight,
+                early_stopping=early_stopping,
+                restore_best_weights=restore_best_weights,
+                patience=patience,
+            )
+        except ValueError as e:
+            log.error(f"Error creating Training Parameters: {e}")
+            exit(1)
+
+        mlflow_params = (
+            None
+            if not mlflow_tracking_uri
+            else MLflowParameters(
+                mlflow_tracking_uri,
+                username=mlflow_tracking_username,
+                password=mlflow_tracking_password,
+                experiment=mlflow_experiment_name,
+            )
+        )
+
+        training.train_model(
+            t_params,
+            mlflow_params,
+        )
@@ -0,0 +1,187 @@
+import hashlib
+import logging as log
+import os
+import re
+import warnings
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+from oct_segmenter import ANNOTATION_CACHE_DIR
+
+# Empty (or blank) field at the start of the text or after a comma
+EMPTY_FIELD_REGEX = re.compile(r"(?:^|,)[ \t]*(?=,|$)")
+
+
+def has_empty_field(line: str) -> bool:
+    # Faster than searching 'EMPTY_FIELD_REGEX' (the line has no trailing
+    # commas, see 'read_csv()')
+    line = line.replace(" ", "").replace("\t", "")
+    return line.startswith(",") or ",," in line
+
+
+class CSVParseError(ValueError):
+    """
+    Raised when a line of a CSV file cannot be parsed or does not have the
+    same number of values as the first line. 'line_number' is 1-based.
+    """
+
+    def __init__(
+        self,
+        csv_path: Union[str, Path],
+        line_number: int,
+        line: str,
+        num_values: Optional[int] = None,
+    ):
+        self.csv_path = csv_path
+        self.line_number = line_number
+        self.line = line
+        self.num_values = num_values
+        if num_values is None:
+            msg = f"Conflicting line {line_number} in {csv_path}: {line}"
+        else:
+            msg = (
+                f"Line {line_number} in {csv_path} has {num_values} values. "
+                "All the lines must have the same number of values."
+            )
+        super().__init__(msg)
+
+
+def parse_csv_line(line: str, dtype) -> np.ndarray:
+    """
+    Parses the comma separated values of 'line'. Empty fields are NaN when
+    'dtype' is a float type and raise ValueError otherwise.
+    """
+    if has_empty_field(line):
+        if np.dtype(dtype).kind != "f":
+            raise ValueError(f"Empty value in CSV line: {line}")
+        line = EMPTY_FIELD_REGEX.sub(lambda match: match.group(0) + "nan", line)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        values = np.fromstring(line, dtype=dtype, sep=",")
+    if len(values) != line.count(",") + 1:
+        raise ValueError(f"Could not parse CSV line: {line}")
+    return values
+
+
+def read_csv(csv_path: Union[str, Path], dtype=np.int64) -> np.ndarray:
+    """
+    Reads a comma separated file of numbers into a 2D array of shape
+    (lines, values per line) and type 'dtype'. Spaces around the values,
+    trailing commas and blank lines (anywhere in the file) are ignored. Empty
+    values are NaN when 'dtype' is a float type (like 'np.genfromtxt()') and
+    raise 'CSVParseError' otherwise.
+
+    The whole file is parsed by NumPy in a single call. Lines are only parsed
+    one by one to find the conflicting line when the file is malformed, in
+    which case 'CSVParseError' is raised with the line number in the file.
+    Lines with a different number of values than the first one also raise
+    'CSVParseError'.
+    """
+    with open(csv_path, "r") as f:
+        lines = [line.rstrip(", \t") for line in f.read().splitlines()]
+
+    # Line numbers in the file of the non-blank lines
+    line_numbers = [i for i, line in enumerate(lines, start=1) if line.strip()]
+    lines = [lines[i - 1] for i in line_numbers]
+
+    if not lines:
+        return np.empty((0, 0), dtype=dtype)
+
+    line_lengths = np.array([line.count(",") + 1 for line in lines])
+    try:
+        values = parse_csv_line(",".join(lines), dtype)
+    except (ValueError, DeprecationWarning):
+        for line_number, line in zip(line_numbers, lines):
+            try:
+                parse_csv_line(line, dtype)
+            except (ValueError, DeprecationWarning):
+                raise CSVParseError(csv_path, line_number, line)
+        raise
+
+    ragged = np.flatnonzero(line_lengths != line_lengths[0])
+    if len(ragged) > 0:
+        i = int(ragged[0])
+        raise CSVParseError(
+            csv_path, line_numbers[i], lines[i], num_values=int(line_lengths[i])
+        )
+
+    return values.reshape(len(lines), line_lengths[0])
+
+
+def annotation_cache_path(csv_path: Path, cache_dir: Path) -> Path:
+    digest = hashlib.sha1(str(csv_path).encode("utf-8")).hexdigest()
+    return cache_dir / Path(digest + ".npz")
+
+
+def compact(values: np.ndarray) -> np.ndarray:
+    """
+    Returns 'values' in the smallest integer dtype that holds them (e.g. the
+    classes of a mask fit in uint8). Other arrays are returned unchanged.
+    """
+    if values.size == 0 or values.dtype.kind not in "iu":
+        return values
+    return values.astype(
+        np.promote_types(
+            np.min_scalar_type(values.min()), np.min_scalar_type(values.max())
+        )
+    )
+
+
+def read_csv_cached(
+    csv_path: Union[str, Path],
+    dtype=np.int64,
+    cache_dir: Path = ANNOTATION_CACHE_DIR,
+) -> np.ndarray:
+    """
+    Same as 'read_csv()' but keeps a binary copy of the parsed array in
+    'cache_dir'. The copy is keyed by the resolved path of the CSV and only
+    used while the size and modification time of the CSV are the ones it was
+    created from, so editing a CSV invalidates it automatically.
+    """
+    csv_path = Path(csv_path).resolve()
+    stat = os.stat(csv_path)
+    cache_path = annotation_cache_path(csv_path, cache_dir)
+
+    try:
+        with np.load(cache_path) as cached:
+            if (
+                str(cached["path"]) == str(csv_path)
+                and cached["size"] == stat.st_size
+                and cached["mtime"] == stat.st_mtime_ns
+                and str(cached["dtype"]) == np.dtype(dtype).str
+            ):
+                return cached["values"].astype(dtype)
+    except (OSError, KeyError, ValueError):
+        pass
+
+    values = read_csv(csv_path, dtype)
+
+    # Written to a temporary file first so that concurrent readers (e.g.
+    # labeling workers) never see a partial file
+    tmp_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.tmp.npz")
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez(
+            tmp_path,
+            path=str(csv_path),
+            size=stat.st_size,
+            mtime=stat.st_mtime_ns,
+            dtype=np.dtype(dtype).str,
+            values=compact(values),
+        )
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        log.warning(f"Could not write annotation cache file: {e}")
+
+    return values
+
+
+def read_annotation_csv(
+    csv_path: Union[str, Path], annotation_cache: bool = True, dtype=np.int64
+) -> np.ndarray:
+    if annotation_cache:
+        return read_csv_cached(csv_path, dtype)
+    return read_csv(csv_path, dtype)
@@ -0,0 +1,293 @@
+"""
+Discovery of the input files (images, labelme files) of the commands.
+
+The input directories are walked with 'os.scandir()' in a pool of threads, one
+directory per task, and the files are returned in the same order as
+'os.walk()'. A file is an input file if its name ends with the extension
+(in any case) and it is not hidden; hidden directories are not walked.
+
+Walks can be saved to and reused from a manifest file (JSON):
+
+    {
+        "version": 3,
+        "scans": [
+            {
+                "root": "<resolved input directory>",
+                "extension": ".tiff",
+                "time": <ns when the walk started>,
+                "dirs": {"<directory relative to root>": <mtime_ns>, ...},
+                "files": [
+                    {
+                        "path": "<path relative to root>",
+                        "size": <bytes>,
+                        "mtime": <mtime_ns>,
+                        "csv": true
+                    },
+                    ...
+                ]
+            },
+            ...
+        ]
+    }
+
+where 'csv' tells whether the annotation CSV of the file (same name with the
+'.csv' extension) is in the same directory. A manifest holds one scan per
+input directory and extension so the same file can be used by commands with
+several input directories.
+
+A scan is only reused while the modification times of its directories and
+the sizes and modification times of its files are the recorded ones: adding,
+removing or renaming a file or a directory changes the modification time of
+its parent directory, and rewriting a file in place changes its own. When
+anything changed the input directory is walked again and the scan replaced.
+Checking a scan takes one 'os.stat()' per directory and per file (in
+parallel) instead of listing every directory. Directories and files modified
+less than 'MTIME_RESOLUTION' before the walk started are always walked
+again, since a later change within the resolution of the file system
+timestamps would go unnoticed.
+"""
+
+from __future__ import annotations
+
+import json
+import logging as log
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from oct_segmenter import DEFAULT_DISCOVERY_THREADS
+
+MANIFEST_VERSION = 3
+
+# Coarsest resolution of the directory modification times (e.g. NFS, FAT)
+MTIME_RESOLUTION = 2 * 10**9
+
+
+def is_input_file(name: str, extension: str) -> bool:
+    return not name.startswith(".") and name.lower().endswith(extension.lower())
+
+
+def scan_directory(
+    path: str, extension: str, stat_files: bool = False
+) -> Tuple[List[Dict], List[str], Optional[int]]:
+    """
+    Returns the input files of the directory 'path' and its subdirectories,
+    both in 'os.scandir()' order, and its modification time (None if it
+    cannot be read). If 'stat_files' is True the size and modification time
+    of the files are added to them.
+    """
+    entries = []
+    subdirs = []
+    names = set()
+    try:
+        # Taken before listing the directory so that a change made while it is
+        # listed is detected the next time
+        mtime = os.stat(path).st_mtime_ns
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+
+                if entry.is_dir():
+                    # Like 'os.walk()', symbolic links to directories are not
+                    # followed
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                    continue
+
+                names.add(entry.name)
+                if is_input_file(entry.name, extension):
+                    entries.append(entry)
+    except OSError as e:
+        log.warning(f"Could not read directory: {e}. Skipping...")
+        return [], [], None
+
+    files = []
+    for entry in entries:
+        csv_name = os.path.splitext(entry.name)[0] + ".csv"
+        file = {"path": entry.path, "csv": csv_name in names}
+        if stat_files:
+            try:
+                stat = entry.stat()
+            except OSError as e:
+                log.warning(f"Could not read file: {e}. Skipping...")
+                continue
+            file.update(size=stat.st_size, mtime=stat.st_mtime_ns)
+        files.append(file)
+
+    return files, subdirs, mtime
+
+
+def walk_input_files(
+    input_dir: Path,
+    extension: str,
+    workers: int = DEFAULT_DISCOVERY_THREADS,
+    dirs: Optional[Dict[str, Optional[int]]] = None,
+) -> List[Dict]:
+    """
+    Returns the input files under 'input_dir' (see 'scan_directory()'),
+    scanning 'workers' directories in parallel. If 'dirs' is given the
+    modification times of the directories walked are added to it and the
+    files hold their size and modification time.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def scan(path: str):
+            files, subdirs, mtime = scan_directory(path, extension, dirs is not None)
+            # Scan the subdirectories as soon as they are found
+            return path, files, mtime, [executor.submit(scan, d) for d in subdirs]
+
+        # Collect the files in 'os.walk()' order: the files of a directory and
+        # then the ones of its subdirectories, depth first
+        input_files = []
+        pending = [executor.submit(scan, str(input_dir))]
+        while pending:
+            path, files, mtime, subdirs = pending.pop().result()
+            input_files.extend(files)
+            pending.extend(reversed(subdirs))
+            if dirs is not None:
+                dirs[path] = mtime
+
+    return input_files
+
+
+def is_scan_current(
+    scan: Dict, input_dir: Path, workers: int = DEFAULT_DISCOVERY_THREADS
+) -> bool:
+    """
+    Returns True if none of the directories and files of 'scan' changed since
+    it was walked (see the description of the manifest above).
+    """
+
+    def stat(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(os.path.join(input_dir, path))
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    try:
+        racy_time = scan["time"] - MTIME_RESOLUTION
+        paths = list(scan["dirs"]) + [file["path"] for file in scan["files"]]
+        # The size of a directory is not compared
+        recorded = [(None, mtime) for mtime in scan["dirs"].values()] + [
+            (file["size"], file["mtime"]) for file in scan["files"]
+        ]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            current = list(executor.map(stat, paths))
+    except (KeyError, TypeError, AttributeError):
+        return False
+
+    return all(
+        now is not None
+        and now[1] == mtime
+        and size in (None, now[0])
+        and mtime < racy_time
+        for (size, mtime), now in zip(recorded, current)
+    )
+
+
+def read_manifest(manifest: Path) -> Dict:
+    """
+    Returns the contents of 'manifest' or an empty manifest if it does not
+    exist or is not valid.
+    """
+    try:
+        with open(manifest) as f:
+            data = json.load(f)
+        if data.get("version") == MANIFEST_VERSION:
+            return data
+        log.warning(f"Ignoring manifest with unknown version: {manifest}")
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, AttributeError) as e:
+        log.warning(f"Ignoring invalid manifest {manifest}: {e}")
+
+    return {"version": MANIFEST_VERSION, "scans": []}
+
+
+def write_manifest(manifest: Path, data: Dict):
+    tmp_path = manifest.with_name(f"{manifest.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, manifest)
+
+
+def find_input_entries(
+    input_dir: Path,
+    extension: str,
+    manifest: Optional[Path] = None,
+    workers: int = DEFAULT_DISCOVERY_THREADS,
+) -> List[Dict]:
+    """
+    Returns the input files under 'input_dir' as dictionaries with the keys
+    'path' (starting with 'input_dir') and 'csv' (and 'size' and 'mtime' when
+    'manifest' is given). If 'manifest' holds a scan of 'input_dir' whose
+    directories and files did not change the directory is not walked;
+    otherwise the scan is added to it (or replaced).
+    """
+    root = str(Path(input_dir).resolve())
+    data = read_manifest(manifest) if manifest is not None else None
+
+    if data is not None:
+        for scan in data["scans"]:
+            if scan.get("root") != root or scan.get("extension") != extension:
+                continue
+
+            if is_scan_current(scan, input_dir, workers):
+                log.info(f"Using the input files of {input_dir} from {manifest}")
+                return [
+                    dict(file, path=os.path.join(input_dir, file["path"]))
+                    for file in scan["files"]
+                ]
+
+            log.info(f"Input files of {input_dir} changed since {manifest} was written")
+            data["scans"].remove(scan)
+            break
+
+    scan_time = time.time_ns()
+    dirs = {}
+    entries = walk_input_files(input_dir, extension, workers, dirs)
+
+    if data is not None:
+        # The paths of the walk all start with 'input_dir'
+        prefix_length = len(os.path.join(input_dir, ""))
+        data["scans"].append(
+            {
+                "root": root,
+                "extension": extension,
+                "time": scan_time,
+                "dirs": {
+                    os.path.relpath(path, input_dir): mtime
+                    for path, mtime in dirs.items()
+                },
+                "files": [
+                    dict(entry, path=entry["path"][prefix_length:]) for entry in entries
+                ],
+            }
+        )
+        try:
+            write_manifest(manifest, data)
+        except OSError as e:
+            log.error(f"Could not write manifest: {e}. Exiting...")
+            exit(1)
+
+    return entries
+
+
+def find_input_files(
+    input_dir: Path,
+    extension: str,
+    manifest: Optional[Path] = None,
+    workers: int = DEFAULT_DISCOVERY_THREADS,
+) -> List[Path]:
+    """
+    Recursively finds the input files under 'input_dir' whose name ends with
+    'extension'. See 'find_input_entries()' for 'manifest'.
+    """
+    return [
+        Path(entry["path"])
+        for entry in find_input_entries(input_dir, extension, manifest, workers)
+    ]
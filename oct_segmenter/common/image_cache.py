@@ -0,0 +1,233 @@
+"""
+Decoded images are cached in '<cache_dir>/<sha256 of the file>-<variant>.npy'
+where 'variant' is 'gray' for the 8-bit grayscale image used by the labelers
+(see 'utils.convert_to_grayscale()') and 'raw' for the image as decoded by
+PIL. Since the entries are keyed by the contents of the files, copies of an
+image (e.g. made by 'partition') share them.
+
+The SHA-256 of a file is remembered in '<cache_dir>/paths' next to its size
+and modification time so that a cached image is found without reading the
+file. The entries are evicted in least recently used order (their
+modification time is updated on every hit) when the cache grows larger than
+'max_image_cache_size' MB (see the config file), together with the entries of
+'<cache_dir>/paths' that point to them.
+
+The cache is disabled unless 'max_image_cache_size' is set: hashing and
+copying the images only pays off when the same images are read again (e.g.
+generating several datasets or predicting from the same directories).
+"""
+
+import hashlib
+import json
+import logging as log
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+import PIL.Image
+
+from oct_segmenter import IMAGE_CACHE_DIR, get_max_image_cache_size
+from oct_segmenter.common import utils
+
+# Fraction of the size cap that can be written before checking it again
+EVICTION_SLACK = 0.05
+
+_bytes_since_eviction: Optional[int] = None
+
+
+def file_sha256(file_path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def write_atomically(path: Path, write):
+    """
+    Calls 'write' with a temporary file object that is renamed to 'path'
+    once written so that concurrent readers never see a partial file. Each
+    call writes its own temporary file, so concurrent writers (processes or
+    threads) of the same 'path' do not interfere.
+    """
+    tmp_path = None
+    try:
+        os.makedirs(path.parent, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False
+        ) as f:
+            tmp_path = f.name
+            write(f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log.warning(f"Could not write image cache file: {e}")
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def cached_file_sha256(file_path: Path, cache_dir: Path) -> str:
+    file_path = file_path.resolve()
+    stat = os.stat(file_path)
+    key = hashlib.sha1(str(file_path).encode("utf-8")).hexdigest()
+    index_path = cache_dir / Path("paths") / Path(key + ".json")
+
+    try:
+        with open(index_path) as f:
+            entry = json.load(f)
+        if (
+            entry["path"] == str(file_path)
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime_ns
+        ):
+            return entry["sha256"]
+    except (OSError, KeyError, ValueError):
+        pass
+
+    sha256 = file_sha256(file_path)
+    entry = {
+        "path": str(file_path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "sha256": sha256,
+    }
+    write_atomically(index_path, lambda f: f.write(json.dumps(entry).encode()))
+    return sha256
+
+
+def iter_cache_entries(cache_dir: Path):
+    try:
+        with os.scandir(cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".npy") and entry.is_file():
+                    yield entry
+    except FileNotFoundError:
+        return
+
+
+def cache_usage(cache_dir: Path = IMAGE_CACHE_DIR) -> Tuple[int, int]:
+    """
+    Returns the number of cached images and their total size in bytes.
+    """
+    entries = list(iter_cache_entries(cache_dir))
+    return len(entries), sum(entry.stat().st_size for entry in entries)
+
+
+def evict(cache_dir: Path, max_size: int):
+    """
+    Removes the least recently used images until the cache is not larger
+    than 'max_size' bytes.
+    """
+    entries = []
+    for entry in iter_cache_entries(cache_dir):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:  # Evicted by another process
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    total_size = sum(size for _, size, _ in entries)
+    evicted = False
+    for _, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+        evicted = True
+
+    if evicted:
+        remove_stale_paths(cache_dir)
+
+
+def remove_stale_paths(cache_dir: Path):
+    """
+    Removes the entries of '<cache_dir>/paths' whose image is no longer
+    cached in any variant.
+    """
+    cached = {entry.name.split("-")[0] for entry in iter_cache_entries(cache_dir)}
+    try:
+        with os.scandir(cache_dir / Path("paths")) as it:
+            index_entries = [entry.path for entry in it if entry.name.endswith(".json")]
+    except FileNotFoundError:
+        return
+
+    for index_path in index_entries:
+        try:
+            with open(index_path) as f:
+                sha256 = json.load(f)["sha256"]
+        except FileNotFoundError:
+            continue
+        except (OSError, KeyError, ValueError):
+            sha256 = None
+        if sha256 not in cached:
+            try:
+                os.remove(index_path)
+            except FileNotFoundError:
+                pass
+
+
+def decode_image(image_path: Path, grayscale: bool) -> np.ndarray:
+    img = PIL.Image.open(image_path, "r")
+    if grayscale:
+        img = utils.convert_to_grayscale(img)
+    return utils.pil_to_array(img)
+
+
+def read_image_cached(
+    image_path: Path,
+    grayscale: bool = False,
+    cache_dir: Path = IMAGE_CACHE_DIR,
+    max_size: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Same as 'decode_image()' but keeps a copy of the decoded image in
+    'cache_dir' (see the description of the cache above). Cached images are
+    loaded instead of decoded; either way the returned array is a writable
+    copy that the caller owns. 'max_size' is the size cap of the cache in
+    bytes and defaults to the one in the config file.
+    """
+    global _bytes_since_eviction
+
+    variant = "gray" if grayscale else "raw"
+    sha256 = cached_file_sha256(Path(image_path), cache_dir)
+    cache_path = cache_dir / Path(f"{sha256}-{variant}.npy")
+
+    try:
+        img = np.load(cache_path)
+        os.utime(cache_path)
+        return img
+    except (OSError, ValueError):
+        pass
+
+    img = decode_image(image_path, grayscale)
+    write_atomically(cache_path, lambda f: np.save(f, img))
+
+    if max_size is None:
+        max_size = get_max_image_cache_size() * 2**20
+    if _bytes_since_eviction is None or _bytes_since_eviction > (
+        EVICTION_SLACK * max_size
+    ):
+        evict(cache_dir, max_size)
+        _bytes_since_eviction = 0
+    _bytes_since_eviction += img.nbytes
+
+    return img
+
+
+def read_image(image_path: Union[str, Path], grayscale: bool = False) -> np.ndarray:
+    """
+    Returns the decoded image 'image_path' as an array. When 'grayscale' is
+    True it is converted to 8-bit grayscale first. If the cache is enabled
+    ('max_image_cache_size' > 0 in the config file) the decoded image is
+    cached (see 'read_image_cached()').
+    """
+    if get_max_image_cache_size() > 0:
+        return read_image_cached(Path(image_path), grayscale)
+    return decode_image(image_path, grayscale)
@@ -0,0 +1,142 @@
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, Union
+
+STRING_VALUE_START = re.compile(rb'\s*:\s*"')
+
+
+class LazyJSONString:
+    """
+    A string value of a JSON document that is only decoded when 'load()' is
+    called. Used for large values, like the base64 encoded image of a labelme
+    file, that are not needed when the document is only validated.
+    """
+
+    __slots__ = ("_data", "_start", "_end", "_value")
+
+    def __init__(self, data: bytes, start: int, end: int):
+        self._data = data
+        self._start = start
+        self._end = end
+        self._value = None
+
+    @classmethod
+    def from_value(cls, value: str) -> "LazyJSONString":
+        """
+        Wraps a string that has already been decoded.
+        """
+        lazy_string = cls(b"", 0, 0)
+        lazy_string._value = value
+        return lazy_string
+
+    def load(self) -> str:
+        if self._value is not None:
+            return self._value
+        return json.loads(self._data[self._start : self._end])
+
+
+def string_end(data: bytes, pos: int) -> int:
+    """
+    Returns the position after the JSON string starting at 'pos' of 'data'
+    without decoding it.
+    """
+    end = pos
+    while True:
+        end = data.find(b'"', end + 1)
+        if end == -1:
+            raise json.JSONDecodeError(
+                "Unterminated string", data.decode("utf-8", "replace"), pos
+            )
+
+        # The quote is escaped if it follows an odd number of backslashes
+        backslash = end - 1
+        while data[backslash] == ord("\\"):
+            backslash -= 1
+        if (end - backslash) % 2 == 1:
+            return end + 1
+
+
+def find_property(data: bytes, name: bytes, pos: int = 0):
+    """
+    Returns the match of the first property 'name' (a quoted key) with a
+    string value found in 'data' from 'pos' on, or None.
+    """
+    pos = data.find(name, pos)
+    while pos != -1:
+        match = STRING_VALUE_START.match(data, pos + len(name))
+        if match is not None:
+            return match
+        pos = data.find(name, pos + 1)
+    return None
+
+
+def find_string_value(data: bytes, key: str):
+    """
+    Returns the (start, end) span of the string value of 'key' if 'key'
+    appears exactly once as a property name in 'data', None otherwise. Only
+    the bytes outside of the value are searched.
+    """
+    name = json.dumps(key).encode("utf-8")
+    match = find_property(data, name)
+    if match is None:
+        return None
+
+    start = match.end() - 1
+    end = string_end(data, start)
+    if find_property(data, name, end) is not None:
+        return None
+
+    return start, end
+
+
+def read_json_object(
+    json_path: Union[str, Path], lazy_keys: Iterable[str] = ()
+) -> Dict[str, Any]:
+    """
+    Reads a file holding a JSON object into a dictionary. The string values
+    of the top-level 'lazy_keys' are returned as 'LazyJSONString' instances.
+    They are neither decoded nor parsed unless the fast path does not apply
+    (e.g. the key also appears in a nested object), in which case the whole
+    document is parsed and the decoded values are wrapped. The rest of the
+    document is parsed as usual (e.g. 'json.JSONDecodeError' is raised when
+    it is malformed).
+    """
+    lazy_keys = list(lazy_keys)
+    with open(json_path, "rb") as f:
+        data = f.read()
+
+    spans = {}
+    for key in lazy_keys:
+        span = find_string_value(data, key)
+        if span is not None:
+            spans[key] = span
+
+    # Parse the document with the lazy values replaced by empty strings
+    parts = []
+    pos = 0
+    for start, end in sorted(spans.values()):
+        parts.extend((data[pos:start], b'""'))
+        pos = end
+    parts.append(data[pos:])
+    obj = json.loads(b"".join(parts))
+
+    if spans and (
+        not isinstance(obj, dict) or any(obj.get(key) != "" for key in spans)
+    ):
+        # A lazy key was not a top-level property
+        spans = {}
+        obj = json.loads(data)
+
+    if not isinstance(obj, dict):
+        return obj
+
+    for key in lazy_keys:
+        if key in spans:
+            start, end = spans[key]
+            obj[key] = LazyJSONString(data, start, end)
+        elif isinstance(obj.get(key), str):
+            # Found more than once or not found by the fast path
+            obj[key] = LazyJSONString.from_value(obj[key])
+
+    return obj
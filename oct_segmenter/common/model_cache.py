@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import functools
+import logging as log
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Hashable, Optional
+
+from oct_segmenter import DEFAULT_MAX_CACHED_MODELS, get_max_cached_models
+
+MLFLOW_RUN_URI_REGEX = re.compile(r"^runs:/(?P<run_id>[^/]+)/")
+
+MODEL_LIBRARY = "oct_image_segmentation_models"
+
+"""
+Process-wide cache of deserialized models.
+
+The models are loaded by the 'oct_image_segmentation_models' library from the
+model path or the MLflow 'runs:/<uuid>/model' URI given in the prediction and
+evaluation parameters, so the models cannot be handed to it. Instead
+'install_model_cache()' wraps the Keras and MLflow loading functions so that
+loading the same model again in the same process (e.g. a notebook or a
+workflow engine calling 'predict()' repeatedly, or the 'serve' command)
+returns the already loaded model. The modules of the library that were
+imported before it and bound the original functions by name are rebound to
+the wrapped ones, so it can be called before or after importing the library.
+
+Models are keyed by resolved path and modification time (a model file that is
+overwritten is loaded again) or by MLflow run id. At most 'max_models' models
+are kept (the 'max_cached_models' option of the 'User' section of the config
+file); the least recently used one is evicted first. A model is loaded
+without holding the lock of the cache: other models are still returned while
+it loads, and the threads asking for the same model wait for that load.
+"""
+
+
+class ModelCache:
+    def __init__(self, max_models: int = DEFAULT_MAX_CACHED_MODELS):
+        self.max_models = max_models
+        self._models: OrderedDict = OrderedDict()
+        self._loading: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, loader: Callable):
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                log.info(f"Using cached model: {key}")
+                return self._models[key]
+
+            future = self._loading.get(key)
+            if future is None:
+                future = self._loading[key] = Future()
+                loading = True
+            else:
+                loading = False
+
+        if not loading:
+            # Loaded by another thread (or raises its error)
+            return future.result()
+
+        try:
+            model = loader()
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._loading[key]
+            if self.max_models > 0:
+                self._models[key] = model
+                while len(self._models) > self.max_models:
+                    evicted_key, _ = self._models.popitem(last=False)
+                    log.info(f"Evicted model from cache: {evicted_key}")
+        future.set_result(model)
+
+        return model
+
+    def set_max_models(self, max_models: int):
+        with self._lock:
+            self.max_models = max_models
+            while len(self._models) > max(max_models, 0):
+                self._models.popitem(last=False)
+
+    @contextmanager
+    def hold(self, min_models: int = 1):
+        """
+        Keeps at least 'min_models' models loaded while the context is active,
+        even if the cache is disabled in the config file, so that a command
+        predicting several batches loads its model only once.
+        """
+        with self._lock:
+            max_models = self.max_models
+            self.max_models = max(max_models, min_models)
+        try:
+            yield self
+        finally:
+            self.set_max_models(max_models)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def __len__(self):
+        return len(self._models)
+
+
+MODEL_CACHE = ModelCache()
+
+
+def model_cache_key(model_path) -> Optional[Hashable]:
+    """
+    Returns the cache key of a model path or MLflow run URI, or None if the
+    model cannot be cached (e.g. the file does not exist).
+    """
+    model_path = str(model_path)
+    match = MLFLOW_RUN_URI_REGEX.match(model_path)
+    if match:
+        return ("mlflow", match.group("run_id"), model_path)
+
+    try:
+        resolved_path = Path(model_path).resolve()
+        return ("path", str(resolved_path), os.stat(resolved_path).st_mtime_ns)
+    except OSError:
+        return None
+
+
+def freeze(value) -> Hashable:
+    """
+    Returns a hashable key for a 'load_model' argument. Dictionaries (e.g.
+    'custom_objects') and sequences are keyed by their items and other
+    unhashable values by their identity.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return ("id", id(value))
+
+
+def cached_loader(load_model: Callable, cache: ModelCache = MODEL_CACHE):
+    if getattr(load_model, "__wrapped_by_model_cache__", False):
+        return load_model
+
+    @functools.wraps(load_model)
+    def wrapper(model_path, *args, **kwargs):
+        key = model_cache_key(model_path)
+        if key is None:
+            return load_model(model_path, *args, **kwargs)
+
+        # The custom objects (losses, metrics) are part of the key: the same
+        # functions passed again give the same key
+        key = key + (load_model.__module__, freeze(args), freeze(kwargs))
+        return cache.get(key, lambda: load_model(model_path, *args, **kwargs))
+
+    wrapper.__wrapped_by_model_cache__ = True
+    return wrapper
+
+
+def install_model_cache(max_models: Optional[int] = None):
+    """
+    Wraps 'tensorflow.keras.models.load_model' and the MLflow Keras and
+    TensorFlow 'load_model' functions (if MLflow is installed) with the model
+    cache, also where the already imported modules of the model library bound
+    them. 'max_models' defaults to the 'max_cached_models' config option.
+    Calling it more than once only updates 'max_models'.
+    """
+    if max_models is None:
+        max_models = get_max_cached_models()
+    MODEL_CACHE.set_max_models(max_models)
+
+    from tensorflow.keras import models as keras_models
+
+    modules = [keras_models]
+    for module_name in ("mlflow.keras", "mlflow.tensorflow"):
+        try:
+            modules.append(__import__(module_name, fromlist=["load_model"]))
+        except ImportError:
+            continue
+
+    wrapped = {}
+    for module in modules:
+        if not getattr(module.load_model, "__wrapped_by_model_cache__", False):
+            wrapped[module.load_model] = cached_loader(module.load_model)
+            module.load_model = wrapped[module.load_model]
+
+    rebind_library_functions(wrapped)
+
+
+def rebind_library_functions(wrapped: Dict[Callable, Callable]):
+    """
+    Replaces the functions bound by name (e.g. 'from tensorflow.keras.models
+    import load_model') in the imported modules of the model library with
+    their 'wrapped' versions.
+    """
+    for name, module in list(sys.modules.items()):
+        if module is None or name.split(".")[0] != MODEL_LIBRARY:
+            continue
+        for attr, value in list(vars(module).items()):
+            for original, wrapper in wrapped.items():
+                if value is original:
+                    setattr(module, attr, wrapper)
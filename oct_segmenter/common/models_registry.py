@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging as log
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MODELS_INDEX_VERSION = 1
+
+"""
+The models registry index is a JSON file that caches the result of walking the
+models directory. Each models directory has its own index file (see
+'models_index_path()') so that installs or configs using different models
+directories do not overwrite each other's index:
+
+{
+    "version": 1,
+    "models_dir": "<path/to/data/models>",
+    "next_index": <index given to the next model found>,
+    "dirs": {"<directory path>": <mtime_ns>, ...},
+    "models": [
+        {
+            "index": 0,
+            "name": "<path of the model directory relative to models_dir>",
+            "path": "<path/to/model.hdf5>",
+            "size": <bytes>,
+            "mtime": <mtime_ns>,
+            "sha256": "<content hash>",
+            "input_shape": [<height>, <width>, <channels>] | null
+        },
+        ...
+    ]
+}
+
+The directory is only walked again when the modification time of one of the
+directories recorded in "dirs" changes (i.e. when a file or directory has been
+added, removed or renamed). Models whose size and modification time did not
+change keep their hash and input shape. Indices are assigned when a model is
+first found and never reused, so they are stable across runs.
+"""
+
+
+def is_model_file(file_name: str) -> bool:
+    return file_name.startswith("model") and file_name.endswith(".hdf5")
+
+
+def hash_file(path: Path, block_size: int = 1 << 20) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def read_model_input_shape(path: Path) -> Optional[List]:
+    """
+    Reads the input shape stored in the Keras model config of an HDF5 model
+    without loading the model. Returns None if it cannot be found.
+    """
+    import h5py
+
+    try:
+        with h5py.File(path, "r") as f:
+            model_config = f.attrs.get("model_config")
+            if model_config is None:
+                return None
+            if isinstance(model_config, bytes):
+                model_config = model_config.decode("utf-8")
+            layers = json.loads(model_config)["config"]["layers"]
+            input_shape = layers[0]["config"]["batch_input_shape"]
+            return list(input_shape[1:])
+    except (OSError, KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+def models_index_path(models_dir: Path, index_dir: Path) -> Path:
+    """
+    Returns the path of the index file of 'models_dir' in 'index_dir', named
+    after the hash of the resolved models directory.
+    """
+    key = hashlib.sha1(str(Path(models_dir).resolve()).encode("utf-8")).hexdigest()
+    return index_dir / Path(key + ".json")
+
+
+def read_models_index(index_path: Path) -> Optional[Dict]:
+    try:
+        with open(index_path, "r") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if index.get("version") != MODELS_INDEX_VERSION:
+        return None
+
+    return index
+
+
+def write_models_index(index: Dict, index_path: Path):
+    tmp_path = index_path.with_name(index_path.name + ".tmp")
+    try:
+        os.makedirs(index_path.parent, exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        log.warning(f"Could not write models index file: {e}")
+
+
+def is_index_stale(index: Dict, models_dir: Path) -> bool:
+    if index["models_dir"] != str(models_dir):
+        return True
+
+    for directory, mtime in index["dirs"].items():
+        try:
+            current_mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            current_mtime = None
+
+        if current_mtime != mtime:
+            return True
+
+    return False
+
+
+def scan_models_dir(models_dir: Path, previous: Optional[Dict] = None) -> Dict:
+    """
+    Walks 'models_dir' and builds a new index. Entries of 'previous' are
+    reused for the models whose size and modification time did not change.
+    """
+    previous_models = {}
+    next_index = 0
+    if previous is not None and previous["models_dir"] == str(models_dir):
+        previous_models = {entry["path"]: entry for entry in previous["models"]}
+        next_index = previous.get("next_index", 0)
+
+    # A missing models directory is recorded so that its creation is detected
+    dirs = {} if os.path.isdir(models_dir) else {str(models_dir): None}
+    models = []
+    for subdir, _, files in os.walk(models_dir):
+        dirs[subdir] = os.stat(subdir).st_mtime_ns
+        for file in sorted(files):
+            if not is_model_file(file):
+                continue
+
+            path = os.path.join(subdir, file)
+            stat = os.stat(path)
+            entry = previous_models.get(path)
+            if (
+                entry is None
+                or entry["size"] != stat.st_size
+                or entry["mtime"] != stat.st_mtime_ns
+            ):
+                entry = {
+                    "index": entry["index"] if entry else None,
+                    "name": str(Path(subdir).relative_to(models_dir)),
+                    "path": path,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime_ns,
+                    "sha256": hash_file(Path(path)),
+                    "input_shape": read_model_input_shape(Path(path)),
+                }
+            models.append(entry)
+
+    # New models are given indices in name order after the existing ones
+    for entry in sorted(models, key=lambda x: x["name"]):
+        if entry["index"] is None:
+            entry["index"] = next_index
+            next_index += 1
+    next_index = max([next_index] + [entry["index"] + 1 for entry in models])
+
+    return {
+        "version": MODELS_INDEX_VERSION,
+        "models_dir": str(models_dir),
+        "next_index": next_index,
+        "dirs": dirs,
+        "models": sorted(models, key=lambda x: x["index"]),
+    }
+
+
+def load_models_index(
+    models_dir: Path, index_path: Path, refresh: bool = False
+) -> List[Dict]:
+    """
+    Returns the list of models (sorted by index) found in 'models_dir'. The
+    persisted index at 'index_path' is used unless it is stale. If 'refresh'
+    is True the directory is walked and all the models are hashed again,
+    keeping their indices.
+    """
+    index = read_models_index(index_path)
+    if index is not None and not refresh and not is_index_stale(index, models_dir):
+        return index["models"]
+
+    if refresh and index is not None:
+        for entry in index["models"]:
+            entry["mtime"] = None  # Forces the model to be hashed again
+
+    index = scan_models_dir(models_dir, index)
+    write_models_index(index, index_path)
+    return index["models"]
@@ -110,27 +110,29 @@ def shape_to_mask(img_shape, points, shape_type=None, line_width=10, point_size=
     mask = np.zeros(img_shape[:2], dtype=np.uint8)
     mask = PIL.Image.fromarray(mask)
     draw = PIL.ImageDraw.Draw(mask)
-    xy = [tuple(point) for point in points]
+    # Flat coordinates [x0, y0, x1, y1, ...] are accepted by all the PIL
+    # drawing functions and much faster to build from point arrays
+    xy = np.ravel(points).tolist()
     if shape_type == "circle":
-        assert len(xy) == 2, "Shape of shape_type=circle must have 2 points"
-        (cx, cy), (px, py) = xy
+        assert len(xy) == 4, "Shape of shape_type=circle must have 2 points"
+        cx, cy, px, py = xy
         d = math.sqrt((cx - px) ** 2 + (cy - py) ** 2)
         draw.ellipse([cx - d, cy - d, cx + d, cy + d], outline=1, fill=1)
     elif shape_type == "rectangle":
-        assert len(xy) == 2, "Shape of shape_type=rectangle must have 2 points"
+        assert len(xy) == 4, "Shape of shape_type=rectangle must have 2 points"
         draw.rectangle(xy, outline=1, fill=1)
     elif shape_type == "line":
-        assert len(xy) == 2, "Shape of shape_type=line must have 2 points"
+        assert len(xy) == 4, "Shape of shape_type=line must have 2 points"
         draw.line(xy=xy, fill=1, width=line_width)
     elif shape_type == "linestrip":
         draw.line(xy=xy, fill=1, width=line_width)
     elif shape_type == "point":
-        assert len(xy) == 1, "Shape of shape_type=point must have 1 points"
-        cx, cy = xy[0]
+        assert len(xy) == 2, "Shape of shape_type=point must have 1 points"
+        cx, cy = xy
         r = point_size
         draw.ellipse([cx - r, cy - r, cx + r, cy + r], outline=1, fill=1)
     else:
-        assert len(xy) > 2, "Polygon must have points more than 2"
+        assert len(xy) > 4, "Polygon must have points more than 2"
         draw.polygon(xy=xy, outline=1, fill=1)
     mask = np.array(mask, dtype=bool)
     return mask
@@ -183,18 +185,25 @@ def make_height_multiple(img, multiple=16, cut_bottom=False) -> PIL.Image:
     return img.crop((0, top_margin, img.width, bottom_margin))
 
 
+def to_8_bit(array: np.ndarray) -> np.ndarray:
+    """
+    Converts the pixels of a 16-bit (or 32-bit) integer image to 8 bits by
+    keeping their 8 most significant bits, i.e. value // 256. Values outside
+    of [0, 65535] saturate to 0 or 255.
+    """
+    if array.dtype.itemsize == 2:
+        return (array >> 8).astype(np.uint8)
+    return np.clip(array >> 8, 0, 255).astype(np.uint8)
+
+
 def convert_to_grayscale(img: PIL.Image) -> PIL.Image:
     if img.mode == "RGBA" or img.mode == "RGB":
         img = img.convert("L")
-    elif img.mode == "I":
-        img = img.point(lambda i: i * (1.0 / 256)).convert("L")
-    elif img.mode == "I;16":
-        img = img.point(lambda i: i * (1.0 / 256)).convert("L")
+    elif img.mode == "I" or img.mode == "I;16" or img.mode == "I;16B":
+        # NumPy takes the byte order of the mode into account
+        img = PIL.Image.fromarray(to_8_bit(np.asarray(img)))
     elif img.mode == "L":
         pass
-    elif img.mode == "I;16B":
-        array = np.uint8(np.rint(np.array(img) / 256.0))
-        img = PIL.Image.fromarray(array)
     else:
         log.error(f"Input image has unexpected mode: '{img.mode}'. Exiting...")
         exit(1)
@@ -2,6 +2,8 @@ import PIL.Image
 
 import sys
 
+from oct_segmenter.common import utils
+
 
 def merge_images(raw_img_file, left_img_file, right_img_file, output_file):
     raw_img = PIL.Image.open(raw_img_file)
@@ -11,7 +13,7 @@ def merge_images(raw_img_file, left_img_file, right_img_file, output_file):
     output_img = raw_img.copy()
 
     if output_img.mode == "I;16":
-        output_img = output_img.point(lambda i: i * (1.0 / 256)).convert("RGB")
+        output_img = utils.convert_to_grayscale(output_img).convert("RGB")
     print(output_img.size)
     print(left_img.size)
     print(right_img.size)
@@ -0,0 +1,133 @@
+"""
+The fingerprints of the input files of a dataset are stored in the HDF5 file
+next to the datasets they describe, in the group '<images_key>_fingerprints':
+
+- 'files': One entry (path, size, mtime, sha256) per input file, including
+  the files that were skipped when labeling. 'path' is relative to the input
+  directory so that the datasets can be updated from any working directory.
+  'size' and 'mtime' are the total size and the latest modification time of
+  the input file and its annotation CSV (if any) and 'sha256' the hash of
+  their contents.
+- 'rows': The path of the input file each row of the datasets comes from.
+- The 'options' attribute holds the labeling options. The datasets are only
+  updated incrementally when they are the same.
+
+A file whose size and modification time did not change is not hashed again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import h5py
+import numpy as np
+
+FINGERPRINTS_VERSION = 2
+
+FINGERPRINT_DTYPE = np.dtype(
+    [
+        ("path", h5py.string_dtype(encoding="utf-8")),
+        ("size", np.int64),
+        ("mtime", np.int64),
+        ("sha256", "S64"),
+    ]
+)
+
+
+def input_file_dependencies(input_file: Path, input_format: str) -> List[Path]:
+    """
+    Returns the files the labeled images of 'input_file' are built from.
+    """
+    if input_format == "labelme":
+        return [input_file]
+
+    csv_path = input_file.parent / Path(input_file.stem + ".csv")
+    return [input_file, csv_path] if csv_path.is_file() else [input_file]
+
+
+def hash_files(paths: List[Path], block_size: int = 1 << 20) -> str:
+    sha256 = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                sha256.update(block)
+    return sha256.hexdigest()
+
+
+def source_path(input_file: Path, input_dir: Path) -> str:
+    """
+    Returns the path of 'input_file' (found in 'input_dir') as stored in the
+    fingerprints.
+    """
+    return str(input_file.relative_to(input_dir))
+
+
+def fingerprint(
+    input_file: Path,
+    input_dir: Path,
+    input_format: str,
+    previous: Optional[Dict] = None,
+) -> Dict:
+    paths = input_file_dependencies(input_file, input_format)
+    stats = [os.stat(path) for path in paths]
+    size = sum(stat.st_size for stat in stats)
+    mtime = max(stat.st_mtime_ns for stat in stats)
+
+    if previous is not None and previous["size"] == size and previous["mtime"] == mtime:
+        sha256 = previous["sha256"]
+    else:
+        sha256 = hash_files(paths)
+
+    return {
+        "path": source_path(input_file, input_dir),
+        "size": size,
+        "mtime": mtime,
+        "sha256": sha256,
+    }
+
+
+def labeling_options(
+    input_format: str, rgb_format: bool, layer_names: Optional[List[str]]
+) -> str:
+    return json.dumps(
+        {
+            "version": FINGERPRINTS_VERSION,
+            "input_format": input_format,
+            "rgb_format": rgb_format,
+            "layer_names": layer_names,
+        }
+    )
+
+
+def read_fingerprints(group: h5py.Group) -> Dict[str, Dict]:
+    fingerprints = {}
+    for entry in group["files"][()]:
+        path = entry["path"]
+        path = path.decode("utf-8") if isinstance(path, bytes) else path
+        fingerprints[path] = {
+            "path": path,
+            "size": int(entry["size"]),
+            "mtime": int(entry["mtime"]),
+            "sha256": entry["sha256"].decode("ascii"),
+        }
+    return fingerprints
+
+
+def write_fingerprints(group: h5py.Group, fingerprints: List[Dict]):
+    if "files" in group:
+        del group["files"]
+
+    group.create_dataset(
+        "files",
+        data=np.array(
+            [
+                (fp["path"], fp["size"], fp["mtime"], fp["sha256"].encode("ascii"))
+                for fp in fingerprints
+            ],
+            dtype=FINGERPRINT_DTYPE,
+        ),
+    )
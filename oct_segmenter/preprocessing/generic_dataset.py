@@ -5,10 +5,16 @@ import os
 import h5py
 import logging as log
 import math
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from typeguard import typechecked
 
+from oct_segmenter.common.file_discovery import find_input_files
+from oct_segmenter.preprocessing import fingerprints
 from oct_segmenter.preprocessing.image_labeling_labelme import (
     generate_image_label_labelme,
 )
@@ -21,144 +27,224 @@ from oct_segmenter.preprocessing.image_labeling_visual_core import (
 from oct_segmenter.preprocessing.image_labeling_wayne import (
     generate_image_label_wayne,
 )
+from oct_segmenter.preprocessing.hdf5_writer import (
+    DEFAULT_CHUNK_SIZE,
+    HDF5DatasetWriter,
+    check_dimensions,
+    create_labels_dataset,
+    encode_labels,
+    labels_dataset_matches,
+    resolve_label_compression,
+    resolve_layout,
+)
 
 
-def process_directory(input_dir, output_dir, save_file=False):
-    img_file_names = []
-    img_file_data = []  # Original image (xhat)
-    labeled_file_data = []  # Segmenation map (yhat)
-    segments_data = []  # Contains the boundaries
+def label_file_visual_core(
+    image_file: Path,
+    output_dir: Path,
+    save_file: bool = False,
+    annotation_cache: bool = True,
+) -> List[Tuple]:
+    print(f"Processing file from Visual Core: {image_file}")
+    (
+        img_name_left,
+        img_array_left,
+        seg_map_left,
+        segs_left,
+        img_name_right,
+        img_array_right,
+        seg_map_right,
+        segs_right,
+    ) = generate_image_label_visual_core(
+        image_file, output_dir, save_file, annotation_cache
+    )
+    if not img_name_left:
+        return []
+
+    return [
+        (
+            [img_name_left, "left".encode("ascii")],
+            img_array_left,
+            seg_map_left,
+            segs_left,
+        ),
+        (
+            [img_name_right, "right".encode("ascii")],
+            img_array_right,
+            seg_map_right,
+            segs_right,
+        ),
+    ]
 
-    for subdir, _, files in os.walk(input_dir):
-        for file in files:
-            if (
-                file.endswith(".tiff")
-                or file.endswith(".TIFF")
-                and not file.startswith(".")
-            ):
-                image_file = Path(os.path.join(subdir, file))
-                print(f"Processing file from Visual Core: {image_file}")
-                (
-                    img_name_left,
-                    img_array_left,
-                    seg_map_left,
-                    segs_left,
-                    img_name_right,
-                    img_array_right,
-                    seg_map_right,
-                    segs_right,
-                ) = generate_image_label_visual_core(image_file, output_dir, save_file)
-                if img_name_left:
-                    img_file_names.extend(
-                        [
-                            [img_name_left, "left".encode("ascii")],
-                            [img_name_right, "right".encode("ascii")],
-                        ]
-                    )
-                    img_file_data.extend([img_array_left, img_array_right])
-                    labeled_file_data.extend([seg_map_left, seg_map_right])
-                    segments_data.extend([segs_left, segs_right])
 
-    if len(img_file_data) == 0:
-        log.info("No images were processed successfully. Exiting...")
-        exit(1)
+def label_file_wayne(
+    image_file: Path,
+    output_dir: Path,
+    save_file: bool = False,
+    annotation_cache: bool = True,
+) -> List[Tuple]:
+    print(f"Processing file from Wayne State University format: {image_file}")
+    img_name, img_array, seg_map, segs = generate_image_label_wayne(
+        image_file, output_dir, save_file, annotation_cache
+    )
+    return [(img_name, img_array, seg_map, segs)] if img_name else []
 
-    # Images a transposed so dim 0 is image width
-    if not all(x.shape[0] == img_file_data[0].shape[0] for x in img_file_data):
-        log.error(
-            "Images contain different widths. All images should have same "
-            "width. Exiting..."
-        )
-        exit(1)
 
-    if not all(x.shape[1] == img_file_data[0].shape[1] for x in img_file_data):
-        log.error(
-            "Images contain different heights. All images should have same "
-            "height. Exiting..."
-        )
-        exit(1)
+def label_file_mask(
+    image_file: Path,
+    output_dir: Path,
+    rgb_format: bool,
+    save_file: bool = False,
+    annotation_cache: bool = True,
+) -> List[Tuple]:
+    print(f"Processing file in mask format: {image_file}")
+    img_name, img_array, seg_map, segs = generate_image_label_mask(
+        image_file, output_dir, rgb_format, save_file, annotation_cache
+    )
+    return [(img_name, img_array, seg_map, segs)] if img_name else []
 
-    return img_file_names, img_file_data, segments_data, labeled_file_data
 
+def label_file_labelme(
+    image_file: Path,
+    output_dir: Path,
+    layer_names: List[str],
+    save_file: bool = False,
+) -> List[Tuple]:
+    print(f"Processing file: {image_file}")
+    img_name, img_array, seg_map, segs = generate_image_label_labelme(
+        image_file,
+        output_dir,
+        layer_names,
+        save_file,
+    )
+    return [(img_name, img_array, seg_map, segs)] if img_name else []
+
+
+def make_label_file_function(
+    input_format: str,
+    output_dir: Path,
+    rgb_format: bool,
+    layer_names: Optional[List[str]],
+    save_file: bool = False,
+    annotation_cache: bool = True,
+) -> Tuple[str, Callable[[Path], List[Tuple]]]:
+    """
+    Returns the extension of the input files of 'input_format' and the
+    function that labels one of them.
+    """
+    if input_format == "wayne":
+        extension = ".tiff"
+        label_file = partial(
+            label_file_wayne,
+            output_dir=output_dir,
+            annotation_cache=annotation_cache,
+        )
+    elif input_format == "labelme":
+        extension = ".json"
+        label_file = partial(
+            label_file_labelme, output_dir=output_dir, layer_names=layer_names
+        )
+    elif input_format == "mask":
+        extension = ".tiff"
+        label_file = partial(
+            label_file_mask,
+            output_dir=output_dir,
+            rgb_format=rgb_format,
+            annotation_cache=annotation_cache,
+        )
+    elif input_format == "visual":
+        extension = ".tiff"
+        label_file = partial(
+            label_file_visual_core,
+            output_dir=output_dir,
+            annotation_cache=annotation_cache,
+        )
+    else:
+        log.error(f"Unrecognized input format: {input_format}. Exiting...")
+        exit(1)
 
-@typechecked
-def process_directory_wayne(input_dir: Path, output_dir: Path, save_file: bool = False):
-    img_file_names = []
-    img_file_data = []  # Original image (xhat)
-    labeled_file_data = []  # Segmenation map (yhat)
-    segments_data = []  # Contains the boundaries
+    return extension, partial(label_file, save_file=save_file)
 
-    for subdir, _, files in os.walk(input_dir):
-        for file in files:
-            if (
-                file.endswith(".tiff") or file.endswith(".TIFF")
-            ) and not file.startswith("."):
-                image_file = Path(os.path.join(subdir, file))
-                print(
-                    "Processing file from Wayne State University format: "
-                    f"{image_file}"
-                )
-                (
-                    img_name,
-                    img_array,
-                    seg_map,
-                    segs,
-                ) = generate_image_label_wayne(image_file, output_dir, save_file)
-                if img_name:
-                    img_file_names.extend([img_name])
-                    img_file_data.extend([img_array])
-                    labeled_file_data.extend([seg_map])
-                    segments_data.extend([segs])
 
-    if len(img_file_data) == 0:
-        log.info("No images were processed successfully. Exiting...")
+def iter_labeled_files(
+    input_files: List[Path],
+    label_file: Callable[[Path], List[Tuple]],
+    workers: int = 1,
+) -> Iterator[Tuple[Path, List[Tuple]]]:
+    """
+    Labels 'input_files' and yields a tuple: (input file, labeled images) for
+    each of them, in the same order as 'input_files'. When 'workers' is
+    greater than 1 the files are labeled in a pool of processes.
+    """
+    if workers < 1:
+        log.error(f"Number of workers must be at least 1: {workers}. Exiting...")
         exit(1)
 
-    # Images a transposed so dim 0 is image width
-    if not all(x.shape[0] == img_file_data[0].shape[0] for x in img_file_data):
-        log.error(
-            "Images contain different widths. All images should have same "
-            "width. Exiting..."
-        )
-        exit(1)
+    if workers == 1:
+        for input_file in input_files:
+            yield input_file, label_file(input_file)
+        return
 
-    if not all(x.shape[1] == img_file_data[0].shape[1] for x in img_file_data):
-        log.error(
-            "Images contain different heights. All images should have same "
-            "height. Exiting..."
-        )
-        exit(1)
+    # Keep a bounded window of pending files so that results of fast workers
+    # do not pile up in memory, and yield them in the order they were found.
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for input_file in input_files:
+            pending.append((input_file, executor.submit(label_file, input_file)))
+            if len(pending) >= 2 * workers:
+                input_file, future = pending.popleft()
+                yield input_file, future.result()
 
-    return img_file_names, img_file_data, segments_data, labeled_file_data
+        while pending:
+            input_file, future = pending.popleft()
+            yield input_file, future.result()
 
 
 @typechecked
-def process_directory_mask(
+def iter_labeled_images(
     input_dir: Path,
     output_dir: Path,
+    input_format: str,
     rgb_format: bool,
+    layer_names: Optional[List[str]],
     save_file: bool = False,
-):
+    workers: int = 1,
+    annotation_cache: bool = True,
+    manifest: Optional[Path] = None,
+) -> Iterator[Tuple]:
+    """
+    Labels the images found in 'input_dir' and yields a tuple: (image source,
+    image, segmentation map, boundaries) for each of them. When 'workers' is
+    greater than 1 the files are labeled in a pool of processes; the tuples
+    are still yielded in the same order as when labeling serially.
+
+    When 'annotation_cache' is True the parsed CSV annotations (Wayne State,
+    Visual Core and mask formats) are cached in binary form and reused on the
+    next runs until the CSVs change.
+
+    The input files are listed in (or taken from) the 'manifest' file if one
+    is given (see 'file_discovery.py').
+    """
+    extension, label_file = make_label_file_function(
+        input_format, output_dir, rgb_format, layer_names, save_file, annotation_cache
+    )
+    input_files = find_input_files(input_dir, extension, manifest)
+
+    for _, labeled_images in iter_labeled_files(input_files, label_file, workers):
+        yield from labeled_images
+
+
+def collect_labeled_images(labeled_images: Iterable[Tuple]):
     img_file_names = []
     img_file_data = []  # Original image (xhat)
     labeled_file_data = []  # Segmenation map (yhat)
     segments_data = []  # Contains the boundaries
 
-    for subdir, _, files in os.walk(input_dir):
-        for file in files:
-            if (
-                file.endswith(".tiff") or file.endswith(".TIFF")
-            ) and not file.startswith("."):
-                image_file = Path(os.path.join(subdir, file))
-                print(f"Processing file in mask format: {image_file}")
-                img_name, img_array, seg_map, segs = generate_image_label_mask(
-                    image_file, output_dir, rgb_format, save_file
-                )
-                if img_name:
-                    img_file_names.extend([img_name])
-                    img_file_data.extend([img_array])
-                    labeled_file_data.extend([seg_map])
-                    segments_data.extend([segs])
+    for img_name, img_array, seg_map, segs in labeled_images:
+        img_file_names.append(img_name)
+        img_file_data.append(img_array)
+        labeled_file_data.append(seg_map)
+        segments_data.append(segs)
 
     if len(img_file_data) == 0:
         log.info("No images were processed successfully. Exiting...")
@@ -181,55 +267,45 @@ def process_directory_mask(
     return img_file_names, img_file_data, segments_data, labeled_file_data
 
 
+def process_directory(input_dir, output_dir, save_file=False):
+    return collect_labeled_images(
+        iter_labeled_images(
+            Path(input_dir), Path(output_dir), "visual", False, None, save_file
+        )
+    )
+
+
 @typechecked
-def process_directory_labelme(
+def process_directory_wayne(input_dir: Path, output_dir: Path, save_file: bool = False):
+    return collect_labeled_images(
+        iter_labeled_images(input_dir, output_dir, "wayne", False, None, save_file)
+    )
+
+
+@typechecked
+def process_directory_mask(
     input_dir: Path,
     output_dir: Path,
-    layer_names: List[str],
+    rgb_format: bool,
     save_file: bool = False,
 ):
-    img_file_names = []
-    img_file_data = []  # Original image (xhat)
-    labeled_file_data = []  # Segmenation map (yhat)
-    segments_data = []  # Contains the boundaries
-
-    for subdir, dirs, files in os.walk(input_dir):
-        for file in files:
-            if file.endswith(".json") and not file.startswith("."):
-                image_file = Path(os.path.join(subdir, file))
-                print(f"Processing file: {image_file}")
-                (img_name, img_array, seg_map, segs,) = generate_image_label_labelme(
-                    image_file,
-                    output_dir,
-                    layer_names,
-                    save_file,
-                )
-
-                if img_name:
-                    img_file_names.extend([img_name])
-                    img_file_data.extend([img_array])
-                    labeled_file_data.extend([seg_map])
-                    segments_data.extend([segs])
+    return collect_labeled_images(
+        iter_labeled_images(input_dir, output_dir, "mask", rgb_format, None, save_file)
+    )
 
-    if len(img_file_data) == 0:
-        log.info("No images were processed successfully. Exiting...")
-        exit(1)
 
-    if not all(x.shape[0] == img_file_data[0].shape[0] for x in img_file_data):
-        log.error(
-            "Images contain different widths. All images should have same "
-            "width. Exiting..."
+@typechecked
+def process_directory_labelme(
+    input_dir: Path,
+    output_dir: Path,
+    layer_names: List[str],
+    save_file: bool = False,
+):
+    return collect_labeled_images(
+        iter_labeled_images(
+            input_dir, output_dir, "labelme", False, layer_names, save_file
         )
-        exit(1)
-
-    if not all(x.shape[1] == img_file_data[0].shape[1] for x in img_file_data):
-        log.error(
-            "Images contain different heights. All images should have same "
-            "height. Exiting..."
-        )
-        exit(1)
-
-    return img_file_names, img_file_data, segments_data, labeled_file_data
+    )
 
 
 def crop_images_to_same_size(img_file_data, segments_data, labeled_file_data):
@@ -281,53 +357,447 @@ def crop_images_to_same_size(img_file_data, segments_data, labeled_file_data):
         ]
 
 
+def fingerprints_key(images_key: str) -> str:
+    return f"{images_key}_fingerprints"
+
+
+def can_update_labeled_images(
+    hf: h5py.Group,
+    keys: Tuple[str, str, str],
+    options: str,
+    compression: Optional[str] = None,
+    label_compression: Optional[str] = None,
+    label_encoding: str = "map",
+) -> bool:
+    """
+    Returns True if the datasets 'keys' of 'hf' were written by
+    'update_labeled_images()' with the same labeling 'options' and the same
+    compression and encoding of the images and labels.
+    """
+    group_key = fingerprints_key(keys[0])
+    if group_key not in hf or hf[group_key].attrs.get("options") != options:
+        return False
+
+    if not all(key in hf and hf[key].maxshape[0] is None for key in keys):
+        return False
+
+    if hf[keys[0]].compression != compression or not labels_dataset_matches(
+        hf[keys[1]], label_encoding, label_compression
+    ):
+        return False
+
+    return len(hf[group_key]["rows"]) == len(hf[keys[0]])
+
+
+def write_new_rows(
+    hf: h5py.Group,
+    labeled_files: Iterable[Tuple[str, List[Tuple]]],
+    keys: Tuple[str, str, str],
+    options: str,
+    chunk_size: int,
+    compression: Optional[str] = None,
+    label_compression: Optional[str] = None,
+    label_encoding: str = "map",
+) -> int:
+    images_key, labels_key, sources_key = keys
+    writer = HDF5DatasetWriter(
+        hf,
+        images_key=images_key,
+        labels_key=labels_key,
+        sources_key=sources_key,
+        chunk_size=chunk_size,
+        compression=compression,
+        label_compression=label_compression,
+        label_encoding=label_encoding,
+    )
+    row_paths = []
+    for path, labeled_images in labeled_files:
+        for img_name, img_array, seg_map, segs in labeled_images:
+            writer.append(img_name, img_array, seg_map, segs)
+            row_paths.append(path)
+
+    if writer.close() == 0:
+        return 0
+
+    group = hf.create_group(fingerprints_key(images_key))
+    group.attrs["options"] = options
+    group.create_dataset(
+        "rows",
+        data=np.array(row_paths, dtype=object),
+        dtype=h5py.string_dtype(encoding="utf-8"),
+        maxshape=(None,),
+        chunks=(chunk_size,),
+    )
+    return len(row_paths)
+
+
+def replace_rows(
+    hf: h5py.Group,
+    labeled_files: Iterable[Tuple[str, List[Tuple]]],
+    keys: Tuple[str, str, str],
+    unchanged: Set[str],
+    label_encoding: str = "map",
+) -> int:
+    """
+    Writes the rows of 'labeled_files' over the rows of the input files that
+    are not in 'unchanged' and appends the rest. The rows that are left over
+    are filled with the last rows of the datasets, which are then shrunk.
+    Returns 0 without modifying the datasets if no rows are left.
+    """
+    rows = hf[fingerprints_key(keys[0])]["rows"]
+    datasets = [hf[key] for key in keys] + [rows]
+    holes = deque(
+        row for row, path in enumerate(rows.asstr()[()]) if path not in unchanged
+    )
+    num_rows = len(rows)
+
+    for path, labeled_images in labeled_files:
+        for img_name, img_array, seg_map, segs in labeled_images:
+            check_dimensions(img_array, datasets[0].shape[1:])
+            if holes:
+                row = holes.popleft()
+            else:
+                row = num_rows
+                num_rows += 1
+                for dataset in datasets:
+                    dataset.resize(num_rows, axis=0)
+
+            values = (
+                img_array,
+                encode_labels(seg_map, segs, label_encoding),
+                np.array(img_name, dtype=object),
+                path,
+            )
+            for dataset, value in zip(datasets, values):
+                dataset[row] = value
+
+    if len(holes) == num_rows:
+        # Nothing was written: every row belongs to a changed or removed file
+        # and none of the files was labeled
+        return 0
+
+    while holes:
+        if holes[-1] == num_rows - 1:
+            holes.pop()
+        else:
+            row = holes.popleft()
+            for dataset in datasets:
+                dataset[row] = dataset[num_rows - 1]
+        num_rows -= 1
+
+    for dataset in datasets:
+        dataset.resize(num_rows, axis=0)
+
+    return num_rows
+
+
 @typechecked
-def generate_generic_dataset(
+def update_labeled_images(
+    hf: h5py.Group,
     input_dir: Path,
-    file_name: Path,
+    output_dir: Path,
     input_format: str,
     rgb_format: bool,
     layer_names: Optional[List[str]],
-    backing_store: bool = True,
-) -> h5py.File:
-    if not os.path.isdir(file_name.parent):
-        os.makedirs(file_name.parent)
+    images_key: str = "xhat",
+    labels_key: str = "yhat",
+    sources_key: str = "image_source",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = 1,
+    annotation_cache: bool = True,
+    compression: Optional[str] = None,
+    label_compression: Optional[str] = None,
+    label_encoding: str = "map",
+    manifest: Optional[Path] = None,
+):
+    """
+    Incremental version of 'write_labeled_images()'. The fingerprints of the
+    input files (see 'fingerprints.py') are stored next to the datasets and,
+    when the datasets are updated again, only the input files that were added
+    or changed since are labeled. Their rows are written over the rows of the
+    changed and removed files, so the rows of the unchanged files are left
+    untouched (except for the last ones, which fill the rows that are left
+    over when files are removed).
+
+    The datasets are regenerated from scratch if they were not written by
+    this function or were labeled (or compressed) with different options.
+    """
+    extension, label_file = make_label_file_function(
+        input_format, output_dir, rgb_format, layer_names, False, annotation_cache
+    )
+    input_files = find_input_files(input_dir, extension, manifest)
+    if not input_files:
+        log.error(f"No input files found in {input_dir}. Exiting...")
+        exit(1)
 
-    hf = h5py.File(file_name, "w", driver="core", backing_store=backing_store)
+    keys = (images_key, labels_key, sources_key)
+    group_key = fingerprints_key(images_key)
+    options = fingerprints.labeling_options(input_format, rgb_format, layer_names)
 
-    if input_format == "wayne":
-        (
-            img_file_names,
-            img_file_data,
-            _,
-            labeled_file_data,
-        ) = process_directory_wayne(input_dir, file_name.parent, save_file=False)
-    elif input_format == "labelme":
-        (
-            img_file_names,
-            img_file_data,
-            _,
-            labeled_file_data,
-        ) = process_directory_labelme(
-            input_dir, file_name.parent, layer_names, save_file=False
+    previous: Dict[str, Dict] = {}
+    if can_update_labeled_images(
+        hf, keys, options, compression, label_compression, label_encoding
+    ):
+        previous = fingerprints.read_fingerprints(hf[group_key])
+    else:
+        for key in keys + (group_key,):
+            if key in hf:
+                del hf[key]
+
+    paths = [fingerprints.source_path(f, input_dir) for f in input_files]
+    current = [
+        fingerprints.fingerprint(
+            input_file, input_dir, input_format, previous.get(path)
         )
-    elif input_format == "mask":
-        (img_file_names, img_file_data, _, labeled_file_data,) = process_directory_mask(
-            input_dir, file_name.parent, rgb_format, save_file=False
+        for input_file, path in zip(input_files, paths)
+    ]
+    unchanged = {
+        fp["path"]
+        for fp in current
+        if fp["path"] in previous and previous[fp["path"]]["sha256"] == fp["sha256"]
+    }
+    changed = [
+        input_file
+        for input_file, path in zip(input_files, paths)
+        if path not in unchanged
+    ]
+    num_removed = len(previous.keys() - {fp["path"] for fp in current})
+    log.info(
+        f"Input files in {input_dir}: {len(unchanged)} unchanged, "
+        f"{len(changed)} added or changed, {num_removed} removed"
+    )
+
+    labeled_files = (
+        (fingerprints.source_path(input_file, input_dir), labeled_images)
+        for input_file, labeled_images in iter_labeled_files(
+            changed, label_file, workers
         )
-    elif input_format == "visual":
-        (
-            img_file_names,
-            img_file_data,
-            _,
-            labeled_file_data,
-        ) = process_directory(input_dir, file_name.parent, save_file=False)
+    )
+    if group_key in hf:
+        num_rows = replace_rows(hf, labeled_files, keys, unchanged, label_encoding)
     else:
-        log.error(f"Unrecognized input format: {input_format}. Exiting...")
+        num_rows = write_new_rows(
+            hf,
+            labeled_files,
+            keys,
+            options,
+            chunk_size,
+            compression,
+            label_compression,
+            label_encoding,
+        )
+
+    if num_rows == 0:
+        log.info("No images were processed successfully. Exiting...")
         exit(1)
 
-    hf.create_dataset("xhat", data=img_file_data)
-    hf.create_dataset("yhat", data=labeled_file_data)
-    hf.create_dataset("image_source", data=img_file_names)
+    fingerprints.write_fingerprints(hf[group_key], current)
+
+
+@typechecked
+def write_labeled_images(
+    hf: h5py.Group,
+    input_dir: Path,
+    output_dir: Path,
+    input_format: str,
+    rgb_format: bool,
+    layer_names: Optional[List[str]],
+    images_key: str = "xhat",
+    labels_key: str = "yhat",
+    sources_key: str = "image_source",
+    streaming: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = 1,
+    annotation_cache: bool = True,
+    incremental: bool = False,
+    layout: Optional[str] = None,
+    compression: Optional[str] = None,
+    label_encoding: str = "map",
+    manifest: Optional[Path] = None,
+):
+    """
+    Labels the images in 'input_dir' and stores them in the 'images_key',
+    'labels_key' and 'sources_key' datasets of 'hf'.
+
+    By default all the labeled images are kept in memory and the datasets are
+    written at once. When 'streaming' is True each labeled image is appended
+    to resizable, chunked datasets as soon as it is produced so memory usage
+    is bounded by one chunk of 'chunk_size' images.
+
+    'workers' is the number of processes used to label the images. See
+    'iter_labeled_images()' for 'annotation_cache' and 'manifest'.
+
+    When 'incremental' is True only the images that were added or changed
+    since the datasets were last written are labeled (see
+    'update_labeled_images()'). The datasets are always chunked then.
+
+    'layout' is the storage layout of the images and segmentation maps:
+    'contiguous' (the default when the datasets are written at once) is the
+    fastest to read in full while 'chunked' datasets are split in chunks of
+    'chunk_size' images that can be compressed with the 'compression' filter
+    ('lzf' or 'gzip'). Chunks of one image are best when the images are read
+    in random order.
+
+    The segmentation maps are stored as uint8 in chunks of one map compressed
+    with the 'compression' filter or, unless 'layout' is 'contiguous', with
+    the default label compression. When 'label_encoding' is 'boundaries' only
+    the boundaries of the layers are stored (see 'encode_labels()').
+    """
+    label_compression = resolve_label_compression(layout, compression, label_encoding)
+    layout = resolve_layout(layout, compression, streaming or incremental)
+
+    if incremental:
+        update_labeled_images(
+            hf,
+            input_dir,
+            output_dir,
+            input_format,
+            rgb_format,
+            layer_names,
+            images_key=images_key,
+            labels_key=labels_key,
+            sources_key=sources_key,
+            chunk_size=chunk_size,
+            workers=workers,
+            annotation_cache=annotation_cache,
+            compression=compression,
+            label_compression=label_compression,
+            label_encoding=label_encoding,
+            manifest=manifest,
+        )
+        return
+
+    labeled_images = iter_labeled_images(
+        input_dir,
+        output_dir,
+        input_format,
+        rgb_format,
+        layer_names,
+        save_file=False,
+        workers=workers,
+        annotation_cache=annotation_cache,
+        manifest=manifest,
+    )
+
+    if streaming:
+        writer = HDF5DatasetWriter(
+            hf,
+            images_key=images_key,
+            labels_key=labels_key,
+            sources_key=sources_key,
+            chunk_size=chunk_size,
+            compression=compression,
+            label_compression=label_compression,
+            label_encoding=label_encoding,
+        )
+        for img_name, img_array, seg_map, segs in labeled_images:
+            writer.append(img_name, img_array, seg_map, segs)
+
+        if writer.close() == 0:
+            log.info("No images were processed successfully. Exiting...")
+            exit(1)
+
+        return
+
+    (
+        img_file_names,
+        img_file_data,
+        segments_data,
+        labeled_file_data,
+    ) = collect_labeled_images(labeled_images)
+
+    chunks = None
+    if layout == "chunked":
+        chunks = (min(chunk_size, len(img_file_data)),) + img_file_data[0].shape
+    hf.create_dataset(
+        images_key, data=img_file_data, chunks=chunks, compression=compression
+    )
+    create_labels_dataset(
+        hf,
+        labels_key,
+        np.stack(
+            [
+                encode_labels(seg_map, segs, label_encoding)
+                for seg_map, segs in zip(labeled_file_data, segments_data)
+            ]
+        ),
+        img_file_data[0].shape[0],
+        label_encoding,
+        label_compression,
+    )
+    hf.create_dataset(sources_key, data=img_file_names)
+
+
+@typechecked
+def open_dataset_file(
+    file_name: Path,
+    streaming: bool = False,
+    backing_store: bool = True,
+    incremental: bool = False,
+) -> h5py.File:
+    """
+    Creates the HDF5 file 'file_name' (and its parent directory). Unless
+    'streaming' is True the file is built in memory and written on close.
+    When 'incremental' is True an existing file is opened for update instead.
+    """
+    if not os.path.isdir(file_name.parent):
+        os.makedirs(file_name.parent)
+
+    if incremental:
+        return h5py.File(file_name, "a")
+
+    if streaming:
+        return h5py.File(file_name, "w")
+
+    return h5py.File(file_name, "w", driver="core", backing_store=backing_store)
+
+
+@typechecked
+def generate_generic_dataset(
+    input_dir: Path,
+    file_name: Path,
+    input_format: str,
+    rgb_format: bool,
+    layer_names: Optional[List[str]],
+    backing_store: bool = True,
+    streaming: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = 1,
+    annotation_cache: bool = True,
+    incremental: bool = False,
+    images_key: str = "xhat",
+    labels_key: str = "yhat",
+    sources_key: str = "image_source",
+    layout: Optional[str] = None,
+    compression: Optional[str] = None,
+    label_encoding: str = "map",
+    manifest: Optional[Path] = None,
+) -> h5py.File:
+    """
+    Labels the images in 'input_dir' and stores them in the 'images_key',
+    'labels_key' and 'sources_key' datasets of the HDF5 file 'file_name'. See
+    'write_labeled_images()' for the description of the remaining parameters.
+    """
+    hf = open_dataset_file(file_name, streaming, backing_store, incremental)
+    write_labeled_images(
+        hf,
+        input_dir,
+        file_name.parent,
+        input_format,
+        rgb_format,
+        layer_names,
+        images_key=images_key,
+        labels_key=labels_key,
+        sources_key=sources_key,
+        streaming=streaming,
+        chunk_size=chunk_size,
+        workers=workers,
+        annotation_cache=annotation_cache,
+        incremental=incremental,
+        layout=layout,
+        compression=compression,
+        label_encoding=label_encoding,
+        manifest=manifest,
+    )
 
     return hf
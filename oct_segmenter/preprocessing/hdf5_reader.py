@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import h5py
+import logging as log
+import numpy as np
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+from oct_segmenter import DEFAULT_LABEL_COMPRESSION
+from oct_segmenter.preprocessing.image_labeling_common import (
+    boundaries_to_label_map,
+)
+
+# Number of segmentation maps rebuilt at once by 'decode_label_boundaries()'
+DECODE_BATCH_SIZE = 64
+
+
+def decode_labels(labels: np.ndarray, height: Optional[int]) -> np.ndarray:
+    """
+    Rebuilds the segmentation maps (N, height, width, 1) from the 'labels'
+    read from a labels dataset. 'height' is None unless the labels are stored
+    as boundaries (N, layers, width).
+    """
+    if height is None:
+        return labels
+
+    return np.stack(
+        [boundaries_to_label_map(boundaries, height) for boundaries in labels]
+    )[..., np.newaxis]
+
+
+def label_map_height(dataset: h5py.Dataset) -> Optional[int]:
+    """
+    Returns the height of the images if the labels 'dataset' stores
+    boundaries instead of segmentation maps, None otherwise.
+    """
+    if dataset.attrs.get("encoding", "map") != "boundaries":
+        return None
+    return int(dataset.attrs["height"])
+
+
+def check_dataset_file(
+    file_name: Path, keys: Sequence[Tuple[str, str]], description: str
+):
+    """
+    Checks that 'file_name' holds the (images, labels) dataset pairs 'keys'
+    with the same number of rows, without reading them. Exits otherwise.
+    """
+    try:
+        with h5py.File(file_name, "r") as hf:
+            for images_key, labels_key in keys:
+                for key in (images_key, labels_key):
+                    if key not in hf:
+                        raise ValueError(f"Dataset '{key}' not found in {file_name}")
+
+                if len(hf[images_key]) != len(hf[labels_key]):
+                    raise ValueError(
+                        f"Datasets '{images_key}' and '{labels_key}' of "
+                        f"{file_name} have different lengths"
+                    )
+
+                images = "chunked" if hf[images_key].chunks else "contiguous"
+                labels = (
+                    "maps" if label_map_height(hf[labels_key]) is None else "boundaries"
+                )
+                log.info(
+                    f"{description}: '{images_key}': {len(hf[images_key])} images "
+                    f"({images}, labels stored as {labels})"
+                )
+    except (OSError, ValueError) as e:
+        log.error(f"Invalid {description.lower()} file: {e}. Exiting...")
+        exit(1)
+
+
+def decode_label_boundaries(
+    file_name: Path, labels_keys: Sequence[str], output_dir: Path
+) -> Path:
+    """
+    Returns 'file_name' if none of its 'labels_keys' datasets stores
+    boundaries. Otherwise writes a file to 'output_dir' (for the consumers
+    that read the maps straight from the file) holding the rebuilt
+    segmentation maps of those datasets and external links to the other
+    datasets of 'file_name', and returns its path. The images are not copied:
+    the file only holds the maps, compressed.
+    """
+    with h5py.File(file_name, "r") as hf:
+        encoded_keys = [
+            key for key in labels_keys if label_map_height(hf[key]) is not None
+        ]
+        if not encoded_keys:
+            return file_name
+
+        decoded_file_name = output_dir / file_name.name
+        log.info(f"Rebuilding the segmentation maps of {file_name}")
+        with h5py.File(decoded_file_name, "w") as decoded:
+            decoded.attrs.update(hf.attrs)
+            for key in hf:
+                if key not in encoded_keys:
+                    decoded[key] = h5py.ExternalLink(str(file_name.absolute()), key)
+                    continue
+
+                height = label_map_height(hf[key])
+                num_layers, width = hf[key].shape[1:]
+                maps = decoded.create_dataset(
+                    key,
+                    shape=(len(hf[key]), height, width, 1),
+                    chunks=(1, height, width, 1),
+                    dtype=np.uint8,
+                    compression=DEFAULT_LABEL_COMPRESSION,
+                )
+                for start in range(0, len(maps), DECODE_BATCH_SIZE):
+                    end = min(start + DECODE_BATCH_SIZE, len(maps))
+                    maps[start:end] = decode_labels(hf[key][start:end], height)
+
+    return decoded_file_name
@@ -0,0 +1,326 @@
+from __future__ import annotations
+
+import h5py
+import logging as log
+import numpy as np
+from typing import List, Optional, Union
+
+from oct_segmenter import (
+    DATASET_COMPRESSIONS,
+    DATASET_LAYOUTS,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_LABEL_COMPRESSION,
+    LABEL_ENCODINGS,
+)
+from oct_segmenter.preprocessing.image_labeling_common import (
+    boundaries_to_label_map,
+)
+
+
+def check_dimensions(img: np.ndarray, expected_shape: tuple):
+    """
+    Exits if 'img' cannot be stored in a dataset of images of shape
+    'expected_shape'.
+    """
+    if img.shape[0] != expected_shape[0]:
+        log.error(
+            "Images contain different heights. All images should have same "
+            "height. Exiting..."
+        )
+        exit(1)
+
+    if img.shape[1:] != expected_shape[1:]:
+        log.error(
+            "Images contain different widths. All images should have same "
+            "width. Exiting..."
+        )
+        exit(1)
+
+
+def resolve_layout(
+    layout: Optional[str], compression: Optional[str], resizable: bool
+) -> str:
+    """
+    Returns the layout of the image and label datasets: 'contiguous' (the
+    default unless the datasets have to be 'resizable') or 'chunked'. Exits
+    if 'layout' and 'compression' cannot be used together.
+    """
+    if layout is None:
+        layout = "chunked" if resizable or compression else "contiguous"
+
+    if layout not in DATASET_LAYOUTS:
+        log.error(f"Unrecognized dataset layout: {layout}. Exiting...")
+        exit(1)
+
+    if compression is not None and compression not in DATASET_COMPRESSIONS:
+        log.error(f"Unrecognized dataset compression: {compression}. Exiting...")
+        exit(1)
+
+    if layout == "contiguous" and resizable:
+        log.error(
+            "Datasets written in streaming or incremental mode are chunked. "
+            "Exiting..."
+        )
+        exit(1)
+
+    if layout == "contiguous" and compression is not None:
+        log.error("Only chunked datasets can be compressed. Exiting...")
+        exit(1)
+
+    return layout
+
+
+def resolve_label_compression(
+    layout: Optional[str], compression: Optional[str], encoding: str
+) -> Optional[str]:
+    """
+    Returns the compression of the labels datasets: the one of the images or,
+    unless the layout is explicitly 'contiguous', the default one. Exits if
+    'encoding' is not a label encoding.
+    """
+    if encoding not in LABEL_ENCODINGS:
+        log.error(f"Unrecognized label encoding: {encoding}. Exiting...")
+        exit(1)
+
+    if compression is not None or layout == "contiguous":
+        return compression
+
+    return DEFAULT_LABEL_COMPRESSION
+
+
+def encode_labels(
+    seg_map: np.ndarray, boundaries: np.ndarray, encoding: str
+) -> np.ndarray:
+    """
+    Returns the segmentation map 'seg_map' (height, width, 1) as it is stored
+    in the labels datasets: as uint8 or, when 'encoding' is 'boundaries', as
+    the boundaries of its layers (layers, width) from which it is rebuilt when
+    read (see 'decode_labels()'). The number of layers is the one of
+    'boundaries', the boundaries given by the labeler.
+
+    The boundary of layer k is stored as the number of rows above it (of a
+    class lower than k) rather than as given by 'generate_boundary()', which
+    is 0 for a layer missing from a column: a missing layer gets the boundary
+    of the next one, so maps whose layers touch or merge are rebuilt exactly.
+    Exits if 'seg_map' cannot be stored that way (its classes are not ordered
+    from top to bottom).
+    """
+    if encoding == "boundaries":
+        classes = np.arange(1, len(boundaries) + 1)[:, np.newaxis, np.newaxis]
+        boundaries = np.sum(
+            seg_map[np.newaxis, ..., 0] < classes, axis=1, dtype=np.int16
+        )
+        if not np.array_equal(
+            boundaries_to_label_map(boundaries, seg_map.shape[0]), seg_map[..., 0]
+        ):
+            log.error(
+                "Segmentation map cannot be rebuilt from its boundaries (its "
+                "layers are not ordered from top to bottom). Use the 'map' "
+                "label encoding. Exiting..."
+            )
+            exit(1)
+        return boundaries
+
+    if seg_map.dtype != np.uint8 and (
+        np.amin(seg_map) < 0 or np.amax(seg_map) > np.iinfo(np.uint8).max
+    ):
+        log.error("Segmentation map classes must be between 0 and 255. Exiting...")
+        exit(1)
+
+    return seg_map.astype(np.uint8, copy=False)
+
+
+def create_labels_dataset(
+    hf: h5py.Group,
+    key: str,
+    labels: np.ndarray,
+    height: int,
+    encoding: str,
+    compression: Optional[str],
+    resizable: bool = False,
+) -> h5py.Dataset:
+    """
+    Creates the dataset 'key' holding 'labels', the encoded segmentation maps
+    (see 'encode_labels()') of images of the given 'height'. Compressed or
+    'resizable' datasets are stored in chunks of one segmentation map.
+    """
+    chunks = None
+    if resizable or compression is not None:
+        chunks = (1,) + labels.shape[1:]
+
+    dataset = hf.create_dataset(
+        key,
+        data=labels,
+        chunks=chunks,
+        maxshape=(None,) + labels.shape[1:] if resizable else None,
+        compression=compression,
+    )
+    if encoding == "boundaries":
+        dataset.attrs["encoding"] = encoding
+        dataset.attrs["height"] = height
+
+    return dataset
+
+
+def labels_dataset_matches(
+    dataset: h5py.Dataset, encoding: str, compression: Optional[str]
+) -> bool:
+    """
+    Returns True if the labels 'dataset' was created by
+    'create_labels_dataset()' with the same 'encoding' and 'compression'.
+    """
+    return (
+        dataset.attrs.get("encoding", "map") == encoding
+        and (encoding == "boundaries" or dataset.dtype == np.uint8)
+        and dataset.compression == compression
+    )
+
+
+class HDF5DatasetWriter:
+    """
+    Appends labeled images to resizable, chunked HDF5 datasets.
+
+    Images are buffered until a whole chunk (``chunk_size`` images) is
+    collected and then written in a single call, so the memory used while
+    generating a dataset is bounded by one chunk regardless of the number of
+    input images. The datasets are created lazily when the first image is
+    appended since their shapes and dtypes are taken from it.
+
+    Parameters
+    ----------
+    hf: h5py.Group
+        File (or group) where the datasets are created.
+    images_key, labels_key, sources_key: str
+        Names of the datasets holding the images, the segmentation maps and
+        the image sources.
+    chunk_size: int
+        Number of images per HDF5 chunk along the first axis.
+    compression: str, optional
+        HDF5 filter ('lzf' or 'gzip') used to compress the images.
+    label_compression: str, optional
+        HDF5 filter used to compress the segmentation maps.
+    label_encoding: str
+        How the segmentation maps are stored (see 'encode_labels()').
+    """
+
+    def __init__(
+        self,
+        hf: h5py.Group,
+        images_key: str = "xhat",
+        labels_key: str = "yhat",
+        sources_key: str = "image_source",
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        compression: Optional[str] = None,
+        label_compression: Optional[str] = None,
+        label_encoding: str = "map",
+    ):
+        if chunk_size < 1:
+            raise ValueError(f"Chunk size must be a positive integer: {chunk_size}")
+
+        self.hf = hf
+        self.images_key = images_key
+        self.labels_key = labels_key
+        self.sources_key = sources_key
+        self.chunk_size = chunk_size
+        self.compression = compression
+        self.label_compression = label_compression
+        self.label_encoding = label_encoding
+
+        self.count = 0  # Number of images flushed to the file
+        self._buffered = 0  # Number of images waiting in the buffers
+        self._images_buf: Optional[np.ndarray] = None
+        self._labels_buf: Optional[np.ndarray] = None
+        self._sources_buf: Optional[np.ndarray] = None
+
+    def _create_datasets(
+        self, img: np.ndarray, labels: np.ndarray, img_source: np.ndarray
+    ):
+        self.hf.create_dataset(
+            self.images_key,
+            shape=(0,) + img.shape,
+            maxshape=(None,) + img.shape,
+            chunks=(self.chunk_size,) + img.shape,
+            dtype=img.dtype,
+            compression=self.compression,
+        )
+
+        create_labels_dataset(
+            self.hf,
+            self.labels_key,
+            np.empty((0,) + labels.shape, dtype=labels.dtype),
+            img.shape[0],
+            self.label_encoding,
+            self.label_compression,
+            resizable=True,
+        )
+
+        self.hf.create_dataset(
+            self.sources_key,
+            shape=(0,) + img_source.shape,
+            maxshape=(None,) + img_source.shape,
+            chunks=(self.chunk_size,) + img_source.shape,
+            dtype=h5py.string_dtype(encoding="ascii"),
+        )
+
+        self._images_buf = np.empty((self.chunk_size,) + img.shape, dtype=img.dtype)
+        self._labels_buf = np.empty(
+            (self.chunk_size,) + labels.shape, dtype=labels.dtype
+        )
+        self._sources_buf = np.empty(
+            (self.chunk_size,) + img_source.shape, dtype=object
+        )
+
+    def append(
+        self,
+        img_source: Union[bytes, List[bytes]],
+        img: np.ndarray,
+        seg_map: np.ndarray,
+        boundaries: Optional[np.ndarray] = None,
+    ):
+        img_source = np.array(img_source, dtype=object)
+        labels = encode_labels(seg_map, boundaries, self.label_encoding)
+        if self._images_buf is None:
+            self._create_datasets(img, labels, img_source)
+        else:
+            check_dimensions(img, self._images_buf.shape[1:])
+
+        self._images_buf[self._buffered] = img
+        self._labels_buf[self._buffered] = labels
+        self._sources_buf[self._buffered, ...] = img_source
+        self._buffered += 1
+
+        if self._buffered == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffered == 0:
+            return
+
+        start = self.count
+        end = self.count + self._buffered
+        for key, buf in (
+            (self.images_key, self._images_buf),
+            (self.labels_key, self._labels_buf),
+            (self.sources_key, self._sources_buf),
+        ):
+            dataset = self.hf[key]
+            dataset.resize(end, axis=0)
+            dataset[start:end] = buf[: self._buffered]
+
+        self.count = end
+        self._buffered = 0
+
+    def close(self) -> int:
+        """
+        Flushes the images left in the buffers and releases them.
+
+        Returns
+        -------
+        count: int
+            Total number of images written.
+        """
+        self.flush()
+        self._images_buf = None
+        self._labels_buf = None
+        self._sources_buf = None
+        return self.count
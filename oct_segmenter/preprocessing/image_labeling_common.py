@@ -1,8 +1,17 @@
+import logging as log
 import numpy as np
 
 from oct_segmenter.common import utils
 
 
+def label_map_dtype(num_classes: int) -> np.dtype:
+    """
+    Returns the smallest unsigned integer dtype that can hold the class ids
+    [0, num_classes] of a segmentation map.
+    """
+    return np.min_scalar_type(num_classes)
+
+
 def generate_boundary(img_array):
     """
     Convention used by code in model: Considering the image in a
@@ -11,13 +20,49 @@ def generate_boundary(img_array):
     the first pixel of the "next region". For example: If the first
     boundary is an array of 2's the top region will be height 2 (0th
     and 1st row)
-    """
-    boundaries = []
-    num_classes = np.amax(img_array)
 
-    for i in range(1, num_classes + 1):
-        boundaries.append([x for x in np.argmax(img_array == i, axis=0)])
-    return np.array(boundaries)
+    'img_array' is a segmentation map of shape (height, width) or a batch of
+    them of shape (N, height, width). Returns an int16 array of shape
+    (num_classes, width) or (N, num_classes, width) where 'num_classes' is the
+    largest class in 'img_array'. The boundary of a class that does not appear
+    in a column is 0.
+    """
+    img_array = np.asarray(img_array)
+    num_classes = int(np.amax(img_array))
+    batch = img_array.reshape((-1,) + img_array.shape[-2:])
+    num_maps, height, width = batch.shape
+    boundaries = np.zeros((num_maps, num_classes, width), dtype=np.int16)
+
+    # Pixels (n, row, col) whose class differs from the pixel above them
+    changes = np.flatnonzero(batch[:, 1:, :] != batch[:, :-1, :])
+    n, rows, cols = np.unravel_index(changes, (num_maps, height - 1, width))
+    rows += 1
+    classes = batch[n, rows, cols]
+
+    if np.all(classes > batch[n, rows - 1, cols]):
+        # Classes increase downwards, so every class is a single run per column
+        # and its boundary is the row where the column changes to it.
+        boundaries[n, classes - 1, cols] = rows
+    else:
+        for i in range(1, num_classes + 1):
+            boundaries[:, i - 1, :] = np.argmax(batch == i, axis=1)
+
+    return boundaries.reshape(img_array.shape[:-2] + boundaries.shape[1:])
+
+
+def boundaries_to_label_map(boundaries: np.ndarray, height: int) -> np.ndarray:
+    """
+    Inverse of 'generate_boundary()': builds the segmentation map of an image
+    of the given height from its boundaries (array of shape (layers, width)).
+    Following the same convention, the pixel of a boundary belongs to the
+    region below it.
+    """
+    rows = np.arange(height)[np.newaxis, :, np.newaxis]
+    return np.sum(
+        rows >= boundaries[:, np.newaxis, :],
+        axis=0,
+        dtype=label_map_dtype(len(boundaries)),
+    )
 
 
 def image_to_label(labelme_img_json):
@@ -53,16 +98,17 @@ def create_label_image(labelme_img_json, output_name, save_file=True) -> np.arra
         np.sort(idx), 0
     ]  # index_list lists the classes as they appear in the array from top to bottom
 
-    # Mapping dictionary
-    index_dict = {}
-    for i in range(num_classes):
-        index_dict[index_list[i]] = i
-
-    def convert(x):
-        return index_dict[x]
-
-    vfunc = np.vectorize(convert)
-    label_arr = vfunc(label_arr)
+    # Lookup table mapping the labelme classes to their top to bottom order
+    lut = np.full(num_classes + 1, num_classes, dtype=label_map_dtype(num_classes))
+    lut[index_list[:num_classes]] = np.arange(len(index_list[:num_classes]))
+    label_arr = lut[label_arr]
+
+    if len(index_list) < num_classes or np.any(label_arr == num_classes):
+        log.error(
+            f"Found classes in {output_name} that do not appear in the first "
+            "column of the image. Exiting..."
+        )
+        exit(1)
 
     if save_file:
         utils.lblsave(output_name, label_arr)
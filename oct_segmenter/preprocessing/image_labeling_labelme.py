@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import os
 
+import itertools
 import json
 import logging as log
 import math
@@ -15,6 +16,7 @@ from typeguard import typechecked
 MIN_WIDTH_THRESHOLD = 780
 
 from oct_segmenter.common import utils
+from oct_segmenter.common.json_reader import read_json_object
 from oct_segmenter.preprocessing import UNET_IMAGE_DIMENSION_MULTIPLICITY
 from oct_segmenter.preprocessing.image_labeling_common import (
     create_label_image,
@@ -45,21 +47,8 @@ def order_layers_from_top_to_bottom(shapes: List[Dict]) -> List[str]:
 
 
 def get_vertical_margins(shapes) -> Tuple[int, int]:
-    left_margin = float("-inf")
-    for shape in shapes:
-        left_margin = (
-            left_margin
-            if left_margin > shape["points"][0][0]
-            else shape["points"][0][0]
-        )
-
-    right_margin = float("inf")
-    for shape in shapes:
-        right_margin = (
-            right_margin
-            if right_margin < shape["points"][-1][0]
-            else shape["points"][-1][0]
-        )
+    left_margin = max(shape["points"][0][0] for shape in shapes)
+    right_margin = min(shape["points"][-1][0] for shape in shapes)
 
     # The margins here can be floats since they can come from using shapes
     left_margin = math.ceil(left_margin)
@@ -96,25 +85,39 @@ def interpolate(x1, y1, x2, y2, xhat):
     return yhat
 
 
-def adjust_and_shift_layer(shape, shift, img_width):
-    new_points = []
+def points_to_array(points) -> np.ndarray:
+    """
+    Converts a list of [x, y] points to a float array of shape (n, 2). Twice
+    as fast as 'np.array()' for the long lists of points of dense layers.
+    """
+    return np.fromiter(
+        itertools.chain.from_iterable(points), dtype=float, count=2 * len(points)
+    ).reshape(-1, 2)
 
-    # These points are the closest points that fall outside the width of the image
-    outside_left_point = None
-    outside_right_point = None
 
+def adjust_and_shift_layer(shape, shift, img_width) -> np.ndarray:
+    """
+    Shifts the points of 'shape' to the left by 'shift' and clips them to
+    the width of the image, adding the points where the layer crosses the
+    left and right sides. Returns the points as an array of shape (n, 2).
+    """
     # Shift all the points to the left
-    for point in shape["points"]:
-        if point[0] - shift < 0:
-            outside_left_point = [point[0] - shift, point[1]]
-            continue
+    points = points_to_array(shape["points"])
+    points[:, 0] -= shift
 
-        if point[0] - shift >= img_width:
-            outside_right_point = [point[0] - shift, point[1]]
-            break
+    # Only the points before the first one that falls outside the right side
+    # of the image are kept
+    outside_right = np.flatnonzero(points[:, 0] >= img_width)
+    end = outside_right[0] if len(outside_right) > 0 else len(points)
+    inside = points[:end, 0] >= 0
+    new_points = points[:end][inside]
 
-        new_point = [point[0] - shift, point[1]]
-        new_points.append(new_point)
+    # These points are the closest points that fall outside the width of the image
+    outside_left_points = points[:end][~inside]
+    outside_left_point = (
+        outside_left_points[-1] if len(outside_left_points) > 0 else None
+    )
+    outside_right_point = points[end] if end < len(points) else None
 
     # Checks
     """
@@ -127,7 +130,7 @@ def adjust_and_shift_layer(shape, shift, img_width):
     also cropped to be multiple of 16.
     Idem for the right side.
     """
-    if outside_left_point != None:
+    if outside_left_point is not None:
         # Add left side-edge point
         x1 = outside_left_point[0]
         y1 = outside_left_point[1]
@@ -135,7 +138,7 @@ def adjust_and_shift_layer(shape, shift, img_width):
         y2 = new_points[0][1]
         xhat = 0
         yhat = interpolate(x1, y1, x2, y2, xhat)
-        new_points.insert(0, [0, yhat])
+        new_points = np.concatenate(([[0, yhat]], new_points))
     elif new_points[0][0] == 0:
         pass
     else:
@@ -144,7 +147,7 @@ def adjust_and_shift_layer(shape, shift, img_width):
         )
         exit(1)
 
-    if outside_right_point != None:
+    if outside_right_point is not None:
         # Add right side-edge point
         x1 = new_points[-1][0]
         y1 = new_points[-1][1]
@@ -152,7 +155,7 @@ def adjust_and_shift_layer(shape, shift, img_width):
         y2 = outside_right_point[1]
         xhat = img_width - 1
         yhat = interpolate(x1, y1, x2, y2, xhat)
-        new_points.append([img_width - 1, yhat])
+        new_points = np.concatenate((new_points, [[img_width - 1, yhat]]))
     elif new_points[-1][0] == img_width - 1:
         pass
     else:
@@ -176,8 +179,8 @@ def create_labelme_file(
 ):
     file = {}
     layer_names.insert(0, "background")
-    img_data = utils.pil_to_data(img)
-    file["imageData"] = str(utils.img_data_to_img_b64(img_data), "utf-8")
+    # The image is only serialized when the file is saved
+    file["imageData"] = None
     file["imagePath"] = original_file_path
     file["version"] = "4.5.9"
     file["flags"] = {}
@@ -187,23 +190,24 @@ def create_labelme_file(
     for shape in shapes:
         shapes_dict[shape["label"]] = shape
 
-    layer_points = [[0, 0], [img.width - 1, 0]]
+    # Each polygon is made of the points of its lower layer followed by the
+    # points of its upper layer in reverse order
+    layer_points = np.array([[0, 0], [img.width - 1, 0]])
     for i in range(1, len(layer_names)):
         shape = shapes_dict[layer_names[i]]
-        extra_points = layer_points
-        extra_points.reverse()
+        upper_points = layer_points
         layer_points = adjust_and_shift_layer(shape, shift, img.width)
-        polygon = layer_points.copy()
-        polygon.extend(extra_points)
         shape["shape_type"] = "polygon"
-        shape["points"] = polygon
+        shape["points"] = np.concatenate((layer_points, upper_points[::-1]))
         shape["label"] = layer_names[i - 1]
 
     # Lower polygon
-    extra_points = layer_points
-    extra_points.reverse()
-    polygon = [[0, img.height - 1], [img.width - 1, img.height - 1]]
-    polygon.extend(extra_points)
+    polygon = np.concatenate(
+        (
+            [[0, img.height - 1], [img.width - 1, img.height - 1]],
+            layer_points[::-1],
+        )
+    )
     shape = {}
     shape["points"] = polygon
     shape["label"] = layer_names[i]
@@ -218,6 +222,10 @@ def create_labelme_file(
     file["imageWidth"] = img.width
 
     if save_file:
+        img_data = utils.pil_to_data(img)
+        file["imageData"] = str(utils.img_data_to_img_b64(img_data), "utf-8")
+        for shape in shapes:
+            shape["points"] = shape["points"].tolist()
         with open(out_file_name, "w") as outfile:
             json.dump(file, outfile)
 
@@ -234,8 +242,8 @@ def generate_image_label_labelme(
     if save_file and not os.path.isdir(output_dir):
         os.mkdir(output_dir)
 
-    with open(img_path) as f:
-        data = json.load(f)
+    # The image is only decoded once the annotations are validated
+    data = read_json_object(img_path, lazy_keys=["imageData"])
 
     img_layers = len(data["shapes"])
     if img_layers != len(layer_names):
@@ -269,7 +277,7 @@ def generate_image_label_labelme(
         return None, None, None, None
 
     multiplicty_height = get_multiplicity_height(data["imageHeight"])
-    img = utils.img_b64_to_pil(data["imageData"])
+    img = utils.img_b64_to_pil(data["imageData"].load())
 
     if (
         img.width % UNET_IMAGE_DIMENSION_MULTIPLICITY != 0
@@ -8,6 +8,8 @@ from typeguard import typechecked
 from typing import Tuple
 
 from oct_segmenter.common import utils
+from oct_segmenter.common.csv_reader import CSVParseError, read_annotation_csv
+from oct_segmenter.common.image_cache import read_image
 from oct_segmenter.preprocessing import UNET_IMAGE_DIMENSION_MULTIPLICITY
 from oct_segmenter.preprocessing.image_labeling_common import generate_boundary
 
@@ -18,27 +20,23 @@ def generate_image_label_mask(
     output_dir: Path,
     rgb_format: bool,
     save_file: bool = True,
+    annotation_cache: bool = True,
 ) -> Tuple[bytes, np.ndarray, np.ndarray, np.ndarray]:
     if save_file and not os.path.isdir(output_dir):
         os.mkdir(output_dir)
 
     csv_path = image_path.parent / Path(image_path.stem + ".csv")
 
-    with open(csv_path, "r") as f:
-        mask = []
-        for line in f.readlines():
-            try:
-                mask.append(
-                    [int(x) for x in line.replace(" ", "").rstrip("\n").split(",")]
-                )
-            except ValueError:
-                log.error(
-                    "Failed to parse CSV line. Conflicting line in ",
-                    f"{csv_path}: {line}",
-                )
-                exit(1)
+    try:
+        mask = read_annotation_csv(csv_path, annotation_cache)
+    except CSVParseError as e:
+        log.error(f"Failed to parse CSV file. {e}")
+        exit(1)
 
-    img = PIL.Image.open(image_path, "r")
+    if rgb_format:
+        img = PIL.Image.open(image_path, "r")
+    else:
+        img = PIL.Image.fromarray(read_image(image_path, grayscale=True))
 
     if (
         img.height % UNET_IMAGE_DIMENSION_MULTIPLICITY != 0
@@ -60,21 +58,19 @@ def generate_image_label_mask(
         )
         exit(1)
 
-    for x_coords in mask:
-        if len(x_coords) != img.width:
-            log.error(
-                "The number of data points has to be equal to the image ",
-                f"width: {img.width}. Found line in CSV file: {csv_path} ",
-                f"with length {len(x_coords)}. Please check CSV",
-            )
-            exit(1)
+    if mask.shape[1] != img.width:
+        log.error(
+            "The number of data points has to be equal to the image "
+            f"width: {img.width}. Found line in CSV file: {csv_path} "
+            f"with length {mask.shape[1]}. Please check CSV"
+        )
+        exit(1)
 
     if rgb_format:
         img = img.convert("RGB")
     else:
         img = utils.convert_to_grayscale(img)
 
-    mask = np.array(mask)
     segs = generate_boundary(mask)
 
     if save_file:
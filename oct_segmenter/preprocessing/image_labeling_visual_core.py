@@ -7,6 +7,8 @@ from pathlib import Path
 import PIL.Image
 
 from oct_segmenter.common import utils
+from oct_segmenter.common.csv_reader import CSVParseError, read_annotation_csv
+from oct_segmenter.common.image_cache import read_image
 from oct_segmenter.preprocessing import (
     VISUAL_CORE_BOUND_X_LEFT_START,
     VISUAL_CORE_BOUND_X_LEFT_END,
@@ -80,8 +82,7 @@ def create_labelme_file_visual_core(
     img, annotations, in_file_name, out_file_name, save_file
 ):
     file = {}
-    img_data = utils.pil_to_data(img)
-    file["imageData"] = str(utils.img_data_to_img_b64(img_data), "utf-8")
+    file["imageData"] = None
     file["imagePath"] = str(in_file_name)
     file["version"] = "4.5.9"
     file["flags"] = {}
@@ -131,46 +132,45 @@ def create_labelme_file_visual_core(
     file["imageWidth"] = img.width
 
     if save_file:
+        img_data = utils.pil_to_data(img)
+        file["imageData"] = str(utils.img_data_to_img_b64(img_data), "utf-8")
         with open(out_file_name, "w") as outfile:
             json.dump(file, outfile)
 
     return file
 
 
-def generate_image_label_visual_core(image_path: Path, output_dir, save_file=True):
+def generate_image_label_visual_core(
+    image_path: Path, output_dir, save_file=True, annotation_cache=True
+):
     if save_file and not os.path.isdir(output_dir):
         os.mkdir(output_dir)
 
     csv_path = image_path.parent / Path(image_path.stem + ".csv")
 
-    with open(csv_path, "r") as f:
-        annotations = []
-        for line in f.readlines():
-            try:
-                layer_x_coords = [
-                    int(x) for x in line.replace(" ", "").rstrip(",\n").split(",")
-                ]
-                if len(layer_x_coords) != VISUAL_CORE_LAYER_DATA_POINTS:
-                    err_msg = " ".join(
-                        (
-                            f"Found {len(layer_x_coords)} points for a given layer in file: {csv_path}.",
-                            f"Expected: {VISUAL_CORE_LAYER_DATA_POINTS}. Make sure to pass the '-w'",
-                            f"if you are using the Wayne State Format",
-                        )
-                    )
-                    log.error(err_msg)
-                    exit(1)
-                annotations.append(layer_x_coords)
-            except ValueError:
-                err_msg = " ".join(
-                    (
-                        "Failed to parse CSV line. Make sure to pass the '-w' if you",
-                        "are using the Wayne State Format",
-                    )
-                )
-                log.error(err_msg)
-                log.error(f"Conflicting line in {csv_path}: {line}")
-                exit(1)
+    try:
+        annotations = read_annotation_csv(csv_path, annotation_cache)
+    except CSVParseError as e:
+        log.error(f"Failed to parse CSV file. {e}")
+        if e.num_values is None:
+            # A value that is not a number, not lines of different lengths
+            log.error(
+                "Make sure to pass the '-w' if you are using the Wayne State Format"
+            )
+        exit(1)
+
+    if annotations.shape[1] != VISUAL_CORE_LAYER_DATA_POINTS:
+        err_msg = " ".join(
+            (
+                f"Found {annotations.shape[1]} points for a given layer in "
+                f"file: {csv_path}.",
+                f"Expected: {VISUAL_CORE_LAYER_DATA_POINTS}. Make sure to pass "
+                "the '-w' if you are using the Wayne State Format",
+            )
+        )
+        log.error(err_msg)
+        exit(1)
+    annotations = annotations.tolist()
 
     """
     The original image provided by NIH is a TIFF file with a pixel depth of 16-bit.
@@ -194,7 +194,7 @@ def generate_image_label_visual_core(image_path: Path, output_dir, save_file=Tru
     https://stackoverflow.com/questions/43978819/convert-tiff-i16-to-jpg-with-pil-pillow
 
     """
-    img = utils.convert_to_grayscale(PIL.Image.open(image_path, "r"))
+    img = PIL.Image.fromarray(read_image(image_path, grayscale=True))
 
     if (
         img.width % UNET_IMAGE_DIMENSION_MULTIPLICITY != 0
@@ -209,8 +209,8 @@ def generate_image_label_visual_core(image_path: Path, output_dir, save_file=Tru
         log.warn(warn_msg)
         return None, None, None, None, None, None, None, None
 
-    img_left_path = Path(output_dir + "/" + image_path.stem + "_left.json")
-    img_right_path = Path(output_dir + "/" + image_path.stem + "_right.json")
+    img_left_path = Path(output_dir) / Path(image_path.stem + "_left.json")
+    img_right_path = Path(output_dir) / Path(image_path.stem + "_right.json")
 
     img_left = img.crop(
         (VISUAL_CORE_BOUND_X_LEFT_START, 0, VISUAL_CORE_BOUND_X_LEFT_END, img.height)
@@ -220,7 +220,7 @@ def generate_image_label_visual_core(image_path: Path, output_dir, save_file=Tru
     )
     label_img_left = create_label_image(
         labelme_img_left_json,
-        output_dir + "/" + image_path.stem + "_left_label.png",
+        str(Path(output_dir) / image_path.stem) + "_left_label.png",
         save_file,
     )
     segs_left = generate_boundary(label_img_left)
@@ -233,7 +233,7 @@ def generate_image_label_visual_core(image_path: Path, output_dir, save_file=Tru
     )
     label_img_right = create_label_image(
         lebelme_img_right_json,
-        output_dir + "/" + image_path.stem + "_right_label.png",
+        str(Path(output_dir) / image_path.stem) + "_right_label.png",
         save_file,
     )
     segs_right = generate_boundary(label_img_right)
@@ -246,12 +246,12 @@ def generate_image_label_visual_core(image_path: Path, output_dir, save_file=Tru
     """
     if save_file:
         np.savetxt(
-            output_dir + "/" + image_path.stem + "_left_matrix.txt",
+            str(Path(output_dir) / image_path.stem) + "_left_matrix.txt",
             utils.pil_to_array(label_img_left),
             fmt="%d",
         )
         np.savetxt(
-            output_dir + "/" + image_path.stem + "_right_matrix.txt",
+            str(Path(output_dir) / image_path.stem) + "_right_matrix.txt",
             utils.pil_to_array(label_img_right),
             fmt="%d",
         )
@@ -7,9 +7,13 @@ from pathlib import Path
 import PIL.Image
 from typeguard import typechecked
 
+from oct_segmenter import WAYNE_STATE_LAYER_NAMES
 from oct_segmenter.common import utils
+from oct_segmenter.common.csv_reader import CSVParseError, read_annotation_csv
+from oct_segmenter.common.image_cache import read_image
 from oct_segmenter.preprocessing import UNET_IMAGE_DIMENSION_MULTIPLICITY
 from oct_segmenter.preprocessing.image_labeling_common import (
+    boundaries_to_label_map,
     create_label_image,
     generate_boundary,
 )
@@ -39,8 +43,7 @@ def create_polygon_wayne(boundary, extra_points, label, image_height):
 
 def create_labelme_file_wayne(img, annotations, in_file_name, out_file_name, save_file):
     file = {}
-    img_data = utils.pil_to_data(img)
-    file["imageData"] = str(utils.img_data_to_img_b64(img_data), "utf-8")
+    file["imageData"] = None
     file["imagePath"] = str(in_file_name)
     file["version"] = "4.5.9"
     file["flags"] = {}
@@ -75,6 +78,8 @@ def create_labelme_file_wayne(img, annotations, in_file_name, out_file_name, sav
     file["imageWidth"] = img.width
 
     if save_file:
+        img_data = utils.pil_to_data(img)
+        file["imageData"] = str(utils.img_data_to_img_b64(img_data), "utf-8")
         with open(out_file_name, "w") as outfile:
             json.dump(file, outfile)
 
@@ -83,10 +88,13 @@ def create_labelme_file_wayne(img, annotations, in_file_name, out_file_name, sav
 
 def process_annotations(annotations, left_margin, right_margin, top_margin):
     """
-    CSVs from Wayne State University might contain 0s in some columns. This function:
-    - Outer loop loops through layers.
-    - First inner loop replaces < 0s from the left side with the first non-zero value from the left
-    - Second inner loop replaces < 0s from the right side with the first non-zero value from the right
+    CSVs from Wayne State University might contain 0s in some columns. For
+    each layer (row of 'annotations'), this function:
+    - Replaces the <= 0s on the left side with the first positive value from the left
+    - Replaces the <= 0s on the right side with the first positive value from the right
+    - Exits if there are <= 0s left in the inner columns.
+
+    Returns the cropped annotations as an array of shape (layers, width).
     """
 
     """
@@ -94,63 +102,72 @@ def process_annotations(annotations, left_margin, right_margin, top_margin):
     the image from top to bottom and we will be building the labelme file from botton to top we need
     to first substract 1 from all annotations.
     """
-    for annot in annotations:
-        for i in range(len(annot)):
-            annot[i] -= 1
-
-    for annot in annotations:
-        for i in range(len(annot)):
-            if annot[i] <= 0:
-                annot[i] = next(x for x in annot[i + 1 :] if x > 0)
-            else:
-                break
-
-        for i in range(len(annot) - 1, 0, -1):
-            if annot[i] <= 0:
-                annot[i] = next(x for x in annot[::-1] if x > 0)
-            else:
-                break
-
-        for i in range(1, len(annot) - 1):
-            if annot[i] <= 0:
-                log.error("Found inner column less or equal to 0. Exiting...")
-                exit(1)
-
-    width = len(annotations[0])
-    return [
-        [x - top_margin for x in annot[left_margin : width - right_margin]]
-        for annot in annotations
-    ]
+    annotations = np.asarray(annotations) - 1
+    positive = annotations > 0
+    if not np.all(np.any(positive, axis=1)):
+        log.error("Found layer without positive values. Exiting...")
+        exit(1)
+
+    layers = np.arange(len(annotations))[:, np.newaxis]
+    columns = np.arange(annotations.shape[1])
+    first = np.argmax(positive, axis=1)[:, np.newaxis]
+    last = annotations.shape[1] - 1 - np.argmax(positive[:, ::-1], axis=1)
+    last = last[:, np.newaxis]
+
+    annotations = np.where(columns < first, annotations[layers, first], annotations)
+    annotations = np.where(columns > last, annotations[layers, last], annotations)
+
+    if np.any(annotations <= 0):
+        log.error("Found inner column less or equal to 0. Exiting...")
+        exit(1)
+
+    width = annotations.shape[1]
+    return annotations[:, left_margin : width - right_margin] - top_margin
+
+
+def can_rasterize_boundaries(annotations) -> bool:
+    """
+    Returns True if the segmentation map built from the labelme polygons of
+    'annotations' (the output of 'process_annotations()') is exactly the one
+    given by 'boundaries_to_label_map()'. This is the case when:
+    - The boundaries do not cross each other.
+    - Consecutive points of a boundary are at most one row apart. Steeper
+      edges are rasterized by PIL as staircases that overlap the next column.
+    - There are no more boundaries than Wayne State layers, since the bottom
+      polygon label ("polygon_6") would otherwise be shared.
+    """
+    annotations = np.asarray(annotations)
+    return (
+        len(annotations) <= len(WAYNE_STATE_LAYER_NAMES)
+        and bool(np.all(np.diff(annotations, axis=0) >= 0))
+        and bool(np.all(np.abs(np.diff(annotations, axis=1)) <= 1))
+    )
 
 
 @typechecked
 def generate_image_label_wayne(
-    image_path: Path, output_dir: Path, save_file: bool = True
+    image_path: Path,
+    output_dir: Path,
+    save_file: bool = True,
+    annotation_cache: bool = True,
 ):
     if save_file and not output_dir.isdir():
         os.mkdir(output_dir)
 
     csv_path = image_path.parent / Path(image_path.stem + ".csv")
 
-    with open(csv_path, "r") as f:
-        annotations = []
-        for line in f.readlines():
-            try:
-                annotations.append(
-                    [int(x) for x in line.replace(" ", "").rstrip("\n").split(",")]
-                )
-            except ValueError:
-                err_msg = " ".join(
-                    (
-                        "Failed to parse CSV line. Make sure to pass the '-w' if you",
-                        "are using the Wayne State Format",
-                    )
-                )
-                log.error(err_msg)
-                log.error(f"Conflicting line in {csv_path}: {line}")
-                exit(1)
+    try:
+        annotations = read_annotation_csv(csv_path, annotation_cache)
+    except CSVParseError as e:
+        log.error(f"Failed to parse CSV file. {e}")
+        if e.num_values is None:
+            # A value that is not a number, not lines of different lengths
+            log.error(
+                "Make sure to pass the '-w' if you are using the Wayne State Format"
+            )
+        exit(1)
 
-    img = PIL.Image.open(image_path, "r")
+    img = PIL.Image.fromarray(read_image(image_path, grayscale=True))
 
     if (
         img.width % UNET_IMAGE_DIMENSION_MULTIPLICITY != 0
@@ -177,8 +194,6 @@ def generate_image_label_wayne(
             log.error(err_msg)
             exit(1)
 
-    img = utils.convert_to_grayscale(img)
-
     output_img_path = output_dir / Path(image_path.stem + ".json")
 
     # U-net architecture requires images with dimensions that are multiple of 16
@@ -198,12 +213,18 @@ def generate_image_label_wayne(
     annotations = process_annotations(
         annotations, left_margin, right_margin_width, top_margin
     )
-    labelme_img_json = create_labelme_file_wayne(
-        img, annotations, image_path, output_img_path, save_file
-    )
-    label_img = create_label_image(
-        labelme_img_json, output_dir / Path(image_path.stem + "_label.png"), save_file
-    )
+    if not save_file and can_rasterize_boundaries(annotations):
+        # No labelme file is requested: build the map from the boundaries
+        label_img = boundaries_to_label_map(annotations, img.height)
+    else:
+        labelme_img_json = create_labelme_file_wayne(
+            img, annotations.tolist(), image_path, output_img_path, save_file
+        )
+        label_img = create_label_image(
+            labelme_img_json,
+            output_dir / Path(image_path.stem + "_label.png"),
+            save_file,
+        )
     segs = generate_boundary(label_img)
 
     if save_file:
@@ -8,6 +8,7 @@ from typeguard import typechecked
 from typing import Tuple
 
 from oct_segmenter.common import utils
+from oct_segmenter.common.image_cache import read_image
 from oct_segmenter.preprocessing import (
     VISUAL_CORE_BOUND_X_LEFT_START,
     VISUAL_CORE_BOUND_X_LEFT_END,
@@ -35,7 +36,7 @@ def generate_side_region_input_image(
     img_left, img_right: np.array, np.array
         The numpy matrices that can be fed to Unet for prediction.
     """
-    img = utils.convert_to_grayscale(PIL.Image.open(image_path, "r"))
+    img = PIL.Image.fromarray(read_image(image_path, grayscale=True))
 
     if (
         img.height % UNET_IMAGE_DIMENSION_MULTIPLICITY != 0
@@ -94,8 +95,19 @@ def generate_input_image(image_path: Path) -> np.ndarray:
     img: np.array, np.array
         The numpy matrices that can be fed to Unet for prediction.
     """
-    img = PIL.Image.open(image_path, "r")
-    img = utils.pil_to_array(img)
+    return array_to_input_image(read_image(image_path))
+
+
+@typechecked
+def pil_to_input_image(img: PIL.Image.Image) -> np.ndarray:
+    """
+    Same as 'generate_input_image()' but for an image that has already been
+    opened (e.g. from an in-memory buffer).
+    """
+    return array_to_input_image(utils.pil_to_array(img))
+
+
+def array_to_input_image(img: np.ndarray) -> np.ndarray:
     ndim = 3  # Make sure images images have dim: (height, width, num_channels)
     # Adds one (i.e. num_channel) dimension when img is 2D.
     padded_shape = (img.shape + (1,) * ndim)[:ndim]
@@ -6,6 +6,7 @@ from typing import List, Optional
 from typeguard import typechecked
 
 from oct_segmenter.preprocessing import generic_dataset as generator
+from oct_segmenter.preprocessing.hdf5_writer import DEFAULT_CHUNK_SIZE
 
 
 @typechecked
@@ -15,21 +16,32 @@ def generate_test_dataset(
     input_format: str,
     rgb_format: bool,
     layer_names: Optional[List[str]],
+    streaming: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = 1,
+    annotation_cache: bool = True,
+    incremental: bool = False,
+    layout: Optional[str] = None,
+    compression: Optional[str] = None,
+    label_encoding: str = "map",
+    manifest: Optional[Path] = None,
 ) -> h5py.File:
-    test_hdf5_file = generator.generate_generic_dataset(
+    return generator.generate_generic_dataset(
         test_input_dir,
         output_file,
         input_format,
         rgb_format,
         layer_names,
+        streaming=streaming,
+        chunk_size=chunk_size,
+        workers=workers,
+        annotation_cache=annotation_cache,
+        incremental=incremental,
+        images_key="test_images",
+        labels_key="test_labels",
+        sources_key="test_images_source",
+        layout=layout,
+        compression=compression,
+        label_encoding=label_encoding,
+        manifest=manifest,
     )
-
-    test_hdf5_file["test_images"] = test_hdf5_file["xhat"]
-    test_hdf5_file["test_labels"] = test_hdf5_file["yhat"]
-    test_hdf5_file["test_images_source"] = test_hdf5_file["image_source"]
-
-    del test_hdf5_file["xhat"]
-    del test_hdf5_file["yhat"]
-    del test_hdf5_file["image_source"]
-
-    return test_hdf5_file
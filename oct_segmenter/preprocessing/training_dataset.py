@@ -6,6 +6,7 @@ from typing import List, Optional
 from typeguard import typechecked
 
 from oct_segmenter.preprocessing import generic_dataset as generator
+from oct_segmenter.preprocessing.hdf5_writer import DEFAULT_CHUNK_SIZE
 
 
 @typechecked
@@ -16,35 +17,47 @@ def generate_training_dataset(
     input_format: str,
     rgb_format: bool,
     layer_names: Optional[List[str]],
+    streaming: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = 1,
+    annotation_cache: bool = True,
+    incremental: bool = False,
+    layout: Optional[str] = None,
+    compression: Optional[str] = None,
+    label_encoding: str = "map",
+    manifest: Optional[Path] = None,
 ) -> h5py.File:
-    training_dataset = generator.generate_generic_dataset(
-        train_input_dir,
-        output_file,
-        input_format,
-        rgb_format,
-        layer_names,
+    """
+    Labels the training and validation images and writes them straight into
+    the 'train_*' and 'val_*' datasets of 'output_file'.
+    """
+    training_dataset = generator.open_dataset_file(
+        output_file, streaming, incremental=incremental
     )
-    validation_dataset = generator.generate_generic_dataset(
-        validation_input_dir,
-        Path("/tmp/validation.hdf5"),
-        input_format,
-        rgb_format,
-        layer_names,
-        backing_store=False,
-    )
-
-    training_dataset["train_images"] = training_dataset["xhat"]
-    training_dataset["train_labels"] = training_dataset["yhat"]
-    training_dataset["train_images_source"] = training_dataset["image_source"]
 
-    del training_dataset["xhat"]
-    del training_dataset["yhat"]
-    del training_dataset["image_source"]
-
-    training_dataset.create_dataset("val_images", data=validation_dataset["xhat"])
-    training_dataset.create_dataset("val_labels", data=validation_dataset["yhat"])
-    training_dataset.create_dataset(
-        "val_images_source", data=validation_dataset["image_source"]
-    )
+    for prefix, input_dir in (
+        ("train", train_input_dir),
+        ("val", validation_input_dir),
+    ):
+        generator.write_labeled_images(
+            training_dataset,
+            input_dir,
+            output_file.parent,
+            input_format,
+            rgb_format,
+            layer_names,
+            images_key=f"{prefix}_images",
+            labels_key=f"{prefix}_labels",
+            sources_key=f"{prefix}_images_source",
+            streaming=streaming,
+            chunk_size=chunk_size,
+            workers=workers,
+            annotation_cache=annotation_cache,
+            incremental=incremental,
+            layout=layout,
+            compression=compression,
+            label_encoding=label_encoding,
+            manifest=manifest,
+        )
 
     return training_dataset
@@ -5,6 +5,8 @@ import logging as log
 import numpy as np
 from pathlib import Path
 
+from oct_segmenter.common.csv_reader import read_csv
+
 EXPECTED_NUMBER_OF_CLASSES = 7
 
 
@@ -35,7 +37,7 @@ if __name__ == "__main__":
     for root, _, files in os.walk(input_dir):
         for filename in files:
             if filename.endswith(".csv") and not filename.startswith("."):
-                mask = np.loadtxt(Path(root) / Path(filename), delimiter=",", dtype=int)
+                mask = read_csv(Path(root) / Path(filename))
                 image_class_fractions = np.vstack(
                     [image_class_fractions, calculate_classes_fraction(mask)]
                 )
@@ -6,6 +6,8 @@ import numpy as np
 from pathlib import Path
 from PIL import Image
 
+from oct_segmenter.common.csv_reader import read_csv
+
 MARGIN = 5
 UNET_IMAGE_DIMENSION_MULTIPLICITY = 16
 
@@ -35,7 +37,7 @@ if __name__ == "__main__":
     for root, _, files in os.walk(input_dir):
         for filename in files:
             if filename.endswith(".csv") and not filename.startswith("."):
-                arr = np.loadtxt(Path(root) / Path(filename), delimiter=",")
+                arr = read_csv(Path(root) / Path(filename))
                 layer_1 = np.argmax(arr == 1, axis=0)  # Layer 1 boundary
                 layer_1_highest_pixel = np.min(layer_1)
                 if overall_layer_1_highest_pixel > layer_1_highest_pixel:
@@ -73,7 +75,7 @@ if __name__ == "__main__":
                     assert cropped_img.width % UNET_IMAGE_DIMENSION_MULTIPLICITY == 0
                     cropped_img.save(Path(output_dir) / Path(filename))
                 if filename.lower().endswith(".csv") and not filename.startswith("."):
-                    arr = np.loadtxt(Path(root) / Path(filename), delimiter=",")
+                    arr = read_csv(Path(root) / Path(filename))
                     arr = arr[top_margin:bottom_margin, :]
                     np.savetxt(
                         Path(output_dir) / Path(filename),
@@ -0,0 +1,136 @@
+import csv
+
+import numpy as np
+import pytest
+
+from oct_segmenter.common.csv_reader import CSVParseError, read_csv
+
+
+def reference_read_csv(csv_path, dtype=int):
+    """
+    Straightforward 'csv.reader' parsing with the same rules as 'read_csv()':
+    spaces around values, trailing commas and blank lines are ignored.
+    """
+    with open(csv_path, newline="") as f:
+        rows = [[cell.strip() for cell in row] for row in csv.reader(f)]
+
+    values = []
+    for row in rows:
+        while row and not row[-1]:
+            row.pop()
+        if row:
+            values.append([dtype(cell) for cell in row])
+    return np.array(values, dtype=dtype)
+
+
+def write(tmp_path, text, name="annotations.csv"):
+    path = tmp_path / name
+    path.write_bytes(text.encode())
+    return path
+
+
+def random_rows(rng, num_rows=6, num_values=40):
+    return rng.integers(0, 500, size=(num_rows, num_values))
+
+
+def format_rows(rows, trailing_comma=False, spaces=False, blank_every=0, newline="\n"):
+    sep = ", " if spaces else ","
+    lines = []
+    for i, row in enumerate(rows):
+        lines.append(sep.join(str(v) for v in row) + ("," if trailing_comma else ""))
+        if blank_every and i % blank_every == blank_every - 1:
+            lines.append("  " if spaces else "")
+    return newline.join(lines) + newline
+
+
+@pytest.mark.parametrize("trailing_comma", [False, True])
+@pytest.mark.parametrize("spaces", [False, True])
+@pytest.mark.parametrize("blank_every", [0, 1, 3])
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_read_csv_equals_csv_reader(
+    tmp_path, trailing_comma, spaces, blank_every, newline
+):
+    rng = np.random.default_rng(blank_every)
+    rows = random_rows(rng)
+    path = write(
+        tmp_path, format_rows(rows, trailing_comma, spaces, blank_every, newline)
+    )
+
+    values = read_csv(path)
+
+    np.testing.assert_array_equal(values, reference_read_csv(path))
+    np.testing.assert_array_equal(values, rows)
+
+
+def test_read_csv_equals_loadtxt_on_well_formed_files(tmp_path):
+    rng = np.random.default_rng(0)
+    rows = random_rows(rng, num_rows=64, num_values=48)
+    path = write(tmp_path, format_rows(rows))
+
+    np.testing.assert_array_equal(
+        read_csv(path), np.loadtxt(path, delimiter=",", dtype=int)
+    )
+
+
+def test_read_csv_floats(tmp_path):
+    # Boundaries read by 'label' (previously with np.genfromtxt, which only
+    # handles files without blank lines and trailing commas)
+    path = write(tmp_path, "1.5, 2.25,3\n\n4,5.75,6,\n")
+    well_formed_path = write(tmp_path, "1.5, 2.25,3\n4,5.75,6\n", "well_formed.csv")
+
+    values = read_csv(path, dtype=float)
+
+    np.testing.assert_array_equal(values, reference_read_csv(path, dtype=float))
+    np.testing.assert_array_equal(
+        values, np.genfromtxt(well_formed_path, delimiter=",")
+    )
+
+
+def test_blank_and_empty_files(tmp_path):
+    assert read_csv(write(tmp_path, "")).shape == (0, 0)
+    assert read_csv(write(tmp_path, "\n \n,,\n")).shape == (0, 0)
+
+
+def test_unparsable_value_reports_file_line_number(tmp_path):
+    path = write(tmp_path, "1,2,3\n\n4,x,6\n")
+
+    with pytest.raises(CSVParseError) as e:
+        read_csv(path)
+
+    assert e.value.line_number == 3
+    assert e.value.num_values is None
+    assert "4,x,6" in str(e.value)
+
+
+def test_ragged_line_reports_file_line_number(tmp_path):
+    path = write(tmp_path, "1,2,3\n\n\n4,5\n")
+
+    with pytest.raises(CSVParseError) as e:
+        read_csv(path)
+
+    assert e.value.line_number == 4
+    assert e.value.num_values == 2
+    assert "has 2 values" in str(e.value)
+
+
+def test_empty_float_values_are_nan(tmp_path):
+    # Rows with blank cells, as loaded by np.genfromtxt before
+    text = "1.5,,3\n, 2,4\n5, ,6\n7,8,9\n"
+    path = write(tmp_path, text)
+
+    values = read_csv(path, dtype=float)
+
+    np.testing.assert_array_equal(values, np.genfromtxt(path, delimiter=","))
+    assert np.isnan(values).sum() == 3
+
+
+@pytest.mark.parametrize(
+    "text, line_number", [("1,,3\n4,5,6\n", 1), ("1,2,3\n\n4, ,6\n", 3)]
+)
+def test_empty_integer_values_report_file_line_number(tmp_path, text, line_number):
+    path = write(tmp_path, text)
+
+    with pytest.raises(CSVParseError) as e:
+        read_csv(path)
+
+    assert e.value.line_number == line_number
@@ -0,0 +1,137 @@
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+from oct_segmenter.common import file_discovery
+from oct_segmenter.common.file_discovery import find_input_entries, find_input_files
+
+
+def make_tree(root, rng, depth=3):
+    names = []
+    for i in range(rng.integers(0, 5)):
+        name = f"f{rng.integers(1000)}_{i}"
+        names.append(name)
+        extension = rng.choice([".tiff", ".TIFF", ".png"])
+        (root / (name + extension)).write_bytes(b"")
+        if rng.random() < 0.5:
+            (root / (name + ".csv")).write_bytes(b"")
+    (root / ".hidden.tiff").write_bytes(b"")
+    if depth > 0:
+        for i in range(rng.integers(1, 4)):
+            subdir = root / f"d{i}"
+            subdir.mkdir()
+            make_tree(subdir, rng, depth - 1)
+        hidden = root / ".hidden_dir"
+        hidden.mkdir()
+        (hidden / "x.tiff").write_bytes(b"")
+
+
+def reference_files(input_dir, extension):
+    files = []
+    for subdir, dirs, names in os.walk(input_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in names:
+            if not name.startswith(".") and name.lower().endswith(extension):
+                files.append(os.path.join(subdir, name))
+    return files
+
+
+def age_tree(root, seconds=100):
+    past = time.time() - seconds
+    for subdir, _, names in os.walk(root):
+        for name in names:
+            os.utime(os.path.join(subdir, name), (past, past))
+        os.utime(subdir, (past, past))
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "input"
+    root.mkdir()
+    make_tree(root, np.random.default_rng(0))
+    age_tree(root)
+    return root
+
+
+@pytest.mark.parametrize("workers", [1, 2, 16])
+def test_files_in_os_walk_order(tree, workers):
+    files = find_input_files(tree, ".tiff", workers=workers)
+    assert [str(f) for f in files] == reference_files(tree, ".tiff")
+
+
+def test_csv_flags(tree):
+    for entry in find_input_entries(tree, ".tiff"):
+        csv_path = os.path.splitext(entry["path"])[0] + ".csv"
+        assert entry["csv"] == os.path.isfile(csv_path)
+
+
+def test_manifest_is_reused(tree, tmp_path, monkeypatch):
+    manifest = tmp_path / "manifest.json"
+    first = find_input_entries(tree, ".tiff", manifest)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The input directory was walked again")
+
+    monkeypatch.setattr(file_discovery, "walk_input_files", fail)
+    assert find_input_entries(tree, ".tiff", manifest) == first
+
+
+def test_manifest_is_refreshed_when_files_change(tree, tmp_path):
+    manifest = tmp_path / "manifest.json"
+    entries = find_input_entries(tree, ".tiff", manifest)
+    without_csv = next(entry for entry in entries if not entry["csv"])
+
+    # New file in a subdirectory and new annotation of an existing file
+    (tree / "d0" / "new.tiff").write_bytes(b"")
+    (tree / (os.path.splitext(without_csv["path"])[0] + ".csv")).write_bytes(b"")
+    entries = find_input_entries(tree, ".tiff", manifest)
+
+    assert [e["path"] for e in entries] == reference_files(tree, ".tiff")
+    assert str(tree / "d0" / "new.tiff") in [e["path"] for e in entries]
+    assert next(e for e in entries if e["path"] == without_csv["path"])["csv"]
+
+    # The refreshed scan replaced the previous one
+    age_tree(tree)
+    with open(manifest) as f:
+        assert len(json.load(f)["scans"]) == 1
+    os.remove(tree / "d0" / "new.tiff")
+    entries = find_input_entries(tree, ".tiff", manifest)
+    assert [e["path"] for e in entries] == reference_files(tree, ".tiff")
+
+
+def test_recently_modified_directories_are_walked_again(tree, tmp_path, monkeypatch):
+    manifest = tmp_path / "manifest.json"
+    # Modified right before the walk: a change within the timestamp
+    # resolution would not be noticed
+    os.utime(tree)
+    find_input_entries(tree, ".tiff", manifest)
+
+    walks = []
+    walk_input_files = file_discovery.walk_input_files
+    monkeypatch.setattr(
+        file_discovery,
+        "walk_input_files",
+        lambda *args, **kwargs: walks.append(1) or walk_input_files(*args, **kwargs),
+    )
+    find_input_entries(tree, ".tiff", manifest)
+    assert walks == [1]
+
+
+def test_manifest_is_refreshed_when_a_file_is_rewritten(tree, tmp_path):
+    manifest = tmp_path / "manifest.json"
+    entries = find_input_entries(tree, ".tiff", manifest)
+    path = entries[0]["path"]
+
+    # Rewritten in place: the modification time of its directory is unchanged
+    past = time.time() - 50
+    with open(path, "wb") as f:
+        f.write(b"new contents")
+    os.utime(path, (past, past))
+
+    entries = find_input_entries(tree, ".tiff", manifest)
+    entry = next(e for e in entries if e["path"] == path)
+    assert entry["size"] == len(b"new contents")
+    assert entry["mtime"] == os.stat(path).st_mtime_ns
@@ -0,0 +1,92 @@
+import h5py
+import numpy as np
+import pytest
+
+from oct_segmenter.preprocessing.hdf5_reader import decode_label_boundaries
+from oct_segmenter.preprocessing.hdf5_writer import (
+    create_labels_dataset,
+    encode_labels,
+)
+from oct_segmenter.preprocessing.image_labeling_common import (
+    boundaries_to_label_map,
+    generate_boundary,
+)
+
+HEIGHT, WIDTH = 64, 32
+
+
+def random_labels(rng, count):
+    boundaries = np.sort(rng.integers(1, HEIGHT, size=(count, 6, WIDTH)), axis=1)
+    maps = np.stack([boundaries_to_label_map(b, HEIGHT) for b in boundaries])
+    return maps[..., np.newaxis], boundaries.astype(np.int16)
+
+
+def write_dataset(path, rng, count, encoding):
+    maps, boundaries = random_labels(rng, count)
+    images = rng.integers(0, 256, size=(count, HEIGHT, WIDTH, 1), dtype=np.uint8)
+    labels = np.stack([encode_labels(m, b, encoding) for m, b in zip(maps, boundaries)])
+    with h5py.File(path, "w") as hf:
+        hf.create_dataset("test_images", data=images)
+        create_labels_dataset(hf, "test_labels", labels, HEIGHT, encoding, "gzip")
+    return images, maps
+
+
+def test_maps_are_returned_unchanged(tmp_path):
+    path = tmp_path / "test_dataset.hdf5"
+    write_dataset(path, np.random.default_rng(0), 3, "map")
+
+    assert decode_label_boundaries(path, ["test_labels"], tmp_path / "out") == path
+
+
+def test_decoded_file_links_to_the_images(tmp_path):
+    path = tmp_path / "test_dataset.hdf5"
+    images, maps = write_dataset(path, np.random.default_rng(0), 130, "boundaries")
+    output_dir = tmp_path / "decoded"
+    output_dir.mkdir()
+
+    decoded_path = decode_label_boundaries(path, ["test_labels"], output_dir)
+
+    assert decoded_path.parent == output_dir
+    with h5py.File(decoded_path, "r") as hf:
+        np.testing.assert_array_equal(hf["test_labels"][:], maps)
+        np.testing.assert_array_equal(hf["test_images"][:], images)
+        # The images are not copied
+        link = hf.get("test_images", getlink=True)
+        assert isinstance(link, h5py.ExternalLink)
+    assert decoded_path.stat().st_size < images.nbytes / 2
+
+
+def test_maps_with_missing_and_merged_layers_round_trip(tmp_path):
+    rng = np.random.default_rng(1)
+    maps, boundaries = random_labels(rng, 4)
+    # Layer 4 is missing from the first columns and layers 2 and 3 merge into
+    # one boundary, so the labeler gives 0 for their missing classes.
+    maps[0, :, :5] = np.where(maps[0, :, :5] == 4, 3, maps[0, :, :5])
+    maps[1, :, -3:] = np.where(maps[1, :, -3:] == 2, 3, maps[1, :, -3:])
+    maps[2] = np.where(maps[2] >= 5, 6, maps[2])
+    boundaries = generate_boundary(maps[..., 0])
+    assert np.any(boundaries == 0)
+
+    labels = np.stack(
+        [encode_labels(m, b, "boundaries") for m, b in zip(maps, boundaries)]
+    )
+    path = tmp_path / "test_dataset.hdf5"
+    with h5py.File(path, "w") as hf:
+        hf.create_dataset("test_images", data=np.zeros_like(maps, dtype=np.uint8))
+        create_labels_dataset(hf, "test_labels", labels, HEIGHT, "boundaries", None)
+    output_dir = tmp_path / "decoded"
+    output_dir.mkdir()
+
+    decoded_path = decode_label_boundaries(path, ["test_labels"], output_dir)
+
+    with h5py.File(decoded_path, "r") as hf:
+        np.testing.assert_array_equal(hf["test_labels"][:], maps)
+
+
+def test_unordered_maps_cannot_be_encoded():
+    seg_map = np.zeros((HEIGHT, WIDTH, 1), dtype=np.uint8)
+    seg_map[HEIGHT // 2 :] = 2
+    seg_map[-4:] = 1
+
+    with pytest.raises(SystemExit):
+        encode_labels(seg_map, generate_boundary(seg_map[..., 0]), "boundaries")
@@ -0,0 +1,96 @@
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import PIL.Image
+
+from oct_segmenter.common import image_cache
+from oct_segmenter.common.image_cache import (
+    cache_usage,
+    decode_image,
+    read_image_cached,
+)
+
+
+def write_images(tmp_path, count):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"image{i}.png"
+        PIL.Image.fromarray(rng.integers(0, 256, (16, 32), dtype=np.uint8)).save(path)
+        paths.append(path)
+    return paths
+
+
+def index_hashes(cache_dir):
+    return {
+        json.loads(path.read_text())["sha256"]
+        for path in (cache_dir / "paths").glob("*.json")
+    }
+
+
+def cached_hashes(cache_dir):
+    return {path.name.split("-")[0] for path in cache_dir.glob("*.npy")}
+
+
+def test_cached_images_equal_decoded_images(tmp_path):
+    cache_dir = tmp_path / "cache"
+    for path in write_images(tmp_path, 2):
+        for grayscale in (False, True):
+            expected = decode_image(path, grayscale)
+            # First read (decoded and cached), then cache hit
+            for _ in range(2):
+                np.testing.assert_array_equal(
+                    read_image_cached(path, grayscale, cache_dir, 2**20), expected
+                )
+
+
+def test_eviction_removes_index_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_cache, "_bytes_since_eviction", None)
+    cache_dir = tmp_path / "cache"
+    paths = write_images(tmp_path, 10)
+    image_size = 16 * 32 + 128  # Pixels and .npy header
+
+    for path in paths:
+        read_image_cached(path, True, cache_dir, max_size=3 * image_size)
+
+    num_images, _ = cache_usage(cache_dir)
+    assert num_images <= 4
+    # Every index entry points to a cached image
+    assert index_hashes(cache_dir) <= cached_hashes(cache_dir)
+    assert len(list((cache_dir / "paths").glob("*.json"))) <= num_images
+
+
+def test_cache_hits_and_misses_return_writable_arrays(tmp_path):
+    cache_dir = tmp_path / "cache"
+    (path,) = write_images(tmp_path, 1)
+
+    for _ in range(2):
+        img = read_image_cached(path, True, cache_dir, 2**20)
+        assert img.flags.writeable
+        img[0, 0] += 1  # Does not change the cached image
+
+    np.testing.assert_array_equal(
+        read_image_cached(path, True, cache_dir, 2**20), decode_image(path, True)
+    )
+
+
+def test_threads_caching_the_same_contents(tmp_path):
+    cache_dir = tmp_path / "cache"
+    (path,) = write_images(tmp_path, 1)
+    copies = [tmp_path / f"copy{i}.png" for i in range(8)]
+    for copy in copies:
+        shutil.copyfile(path, copy)
+
+    with ThreadPoolExecutor(max_workers=len(copies)) as executor:
+        images = list(
+            executor.map(
+                lambda copy: read_image_cached(copy, True, cache_dir, 2**20), copies
+            )
+        )
+
+    for img in images:
+        np.testing.assert_array_equal(img, decode_image(path, True))
+    assert len(list(cache_dir.glob("*.npy"))) == 1
+    assert not list(cache_dir.glob("**/*.tmp"))
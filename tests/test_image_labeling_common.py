@@ -0,0 +1,142 @@
+import numpy as np
+import pytest
+
+from oct_segmenter.preprocessing import image_labeling_common
+from oct_segmenter.preprocessing.image_labeling_common import (
+    boundaries_to_label_map,
+    create_label_image,
+    generate_boundary,
+)
+
+
+def reference_remap(label_arr):
+    """
+    The class remap of 'create_label_image()' before the lookup table: one
+    dictionary lookup per pixel.
+    """
+    num_classes = np.max(label_arr)
+    _, idx = np.unique(label_arr[:, 0], return_index=True)
+    index_list = label_arr[np.sort(idx), 0]
+    index_dict = {index_list[i]: i for i in range(num_classes)}
+    return np.vectorize(lambda x: index_dict[x])(label_arr)
+
+
+def random_labelme_map(rng, num_classes, height=40, width=24):
+    """
+    A map of labelme class ids (1 to 'num_classes', in random order from top
+    to bottom) like the ones rasterized from labelme polygons.
+    """
+    classes = rng.permutation(np.arange(1, num_classes + 1))
+    boundaries = np.sort(rng.integers(1, height, size=(num_classes - 1, width)), 0)
+    # Every class appears in the first column
+    boundaries[:, 0] = np.arange(1, num_classes) * (height // num_classes)
+    layers = np.sum(np.arange(height)[:, np.newaxis] >= boundaries[:, None], axis=0)
+    return classes[layers].astype(np.int32)
+
+
+def remap(monkeypatch, label_arr):
+    monkeypatch.setattr(image_labeling_common, "image_to_label", lambda _: label_arr)
+    return create_label_image({}, None, save_file=False)
+
+
+@pytest.mark.parametrize("num_classes", [1, 2, 4, 7, 9, 20])
+def test_lookup_table_remap_equals_reference(monkeypatch, num_classes):
+    rng = np.random.default_rng(num_classes)
+    for _ in range(10):
+        label_arr = random_labelme_map(rng, num_classes)
+        label_map = remap(monkeypatch, label_arr)
+
+        np.testing.assert_array_equal(label_map, reference_remap(label_arr))
+        assert label_map.dtype == np.uint8
+
+
+def test_class_missing_from_first_column_exits(monkeypatch):
+    label_arr = np.array([[1, 1], [2, 3]], dtype=np.int32)
+    with pytest.raises(SystemExit):
+        remap(monkeypatch, label_arr)
+
+
+def reference_boundaries(img_array):
+    """
+    'generate_boundary()' before the single pass: one argmax per class.
+    """
+    num_classes = np.amax(img_array)
+    return np.array(
+        [np.argmax(img_array == i, axis=0) for i in range(1, num_classes + 1)]
+    )
+
+
+def random_monotone_map(rng, num_classes, height=48, width=32):
+    boundaries = np.sort(rng.integers(0, height, size=(num_classes, width)), axis=0)
+    return boundaries_to_label_map(boundaries, height)
+
+
+@pytest.mark.parametrize("num_classes", [1, 3, 6, 7, 12])
+def test_generate_boundary_equals_reference_on_monotone_maps(num_classes):
+    rng = np.random.default_rng(num_classes)
+    for _ in range(20):
+        label_map = random_monotone_map(rng, num_classes)
+        if label_map.max() == 0:
+            continue
+
+        boundaries = generate_boundary(label_map)
+
+        assert boundaries.dtype == np.int16
+        np.testing.assert_array_equal(boundaries, reference_boundaries(label_map))
+
+
+def test_generate_boundary_inverts_boundaries_to_label_map():
+    rng = np.random.default_rng(0)
+    height = 48
+    # Strictly increasing boundaries below the first row: every class appears
+    # in every column
+    boundaries = np.sort(rng.choice(np.arange(1, height), (6, 1), False), axis=0)
+    boundaries = boundaries + np.zeros((1, 32), dtype=int)
+    label_map = boundaries_to_label_map(boundaries, height)
+
+    np.testing.assert_array_equal(generate_boundary(label_map), boundaries)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_generate_boundary_equals_reference_on_non_monotone_maps(seed):
+    # Crossing layers, classes appearing twice in a column and class jumps
+    rng = np.random.default_rng(seed)
+    label_map = rng.integers(0, 8, size=(16, 12)).astype(np.uint8)
+    if seed % 2:
+        label_map = np.sort(label_map, axis=0)[::-1]
+
+    np.testing.assert_array_equal(
+        generate_boundary(label_map), reference_boundaries(label_map)
+    )
+
+
+def test_generate_boundary_skipped_classes():
+    # Columns that jump over classes or start below class 0
+    label_map = np.array(
+        [
+            [0, 0, 2, 0],
+            [1, 3, 2, 0],
+            [3, 3, 3, 0],
+            [3, 3, 3, 3],
+        ],
+        dtype=np.uint8,
+    )
+    np.testing.assert_array_equal(
+        generate_boundary(label_map), reference_boundaries(label_map)
+    )
+
+
+def test_generate_boundary_on_batches():
+    rng = np.random.default_rng(0)
+    label_maps = np.stack([random_monotone_map(rng, 7) for _ in range(5)])
+    # Classes up to the largest one in the batch
+    num_classes = int(label_maps.max())
+
+    boundaries = generate_boundary(label_maps)
+
+    assert boundaries.shape == (5, num_classes, label_maps.shape[2])
+    for label_map, map_boundaries in zip(label_maps, boundaries):
+        expected = np.zeros_like(map_boundaries)
+        reference = reference_boundaries(label_map)
+        expected[: len(reference)] = reference
+        np.testing.assert_array_equal(map_boundaries, expected)
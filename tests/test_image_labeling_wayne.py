@@ -0,0 +1,87 @@
+import numpy as np
+import PIL.Image
+import pytest
+
+from oct_segmenter import WAYNE_STATE_LAYER_NAMES
+from oct_segmenter.preprocessing.image_labeling_common import (
+    boundaries_to_label_map,
+    create_label_image,
+)
+from oct_segmenter.preprocessing.image_labeling_wayne import (
+    can_rasterize_boundaries,
+    create_labelme_file_wayne,
+)
+
+HEIGHT, WIDTH = 64, 48
+
+
+def random_boundaries(rng, num_layers=len(WAYNE_STATE_LAYER_NAMES)):
+    """
+    Non-crossing boundaries (as returned by 'process_annotations()') whose
+    consecutive points are at most one row apart. Like in real annotations,
+    every layer appears in the first column; further right, boundaries can
+    touch.
+    """
+    start = np.sort(rng.choice(np.arange(8, HEIGHT - 8, 2), num_layers, False))
+    steps = rng.integers(-1, 2, size=(num_layers, WIDTH - 1))
+    walks = start[:, np.newaxis] + np.cumsum(steps, axis=1)
+    walks = np.concatenate([start[:, np.newaxis], walks], axis=1)
+    # Sorting each column keeps the steps of every boundary within one row
+    return np.sort(np.clip(walks, 1, HEIGHT - 1), axis=0)
+
+
+def polygon_label_map(boundaries):
+    """
+    The segmentation map built through labelme polygons (the path used when
+    the labelme file is saved).
+    """
+    img = PIL.Image.new("L", (WIDTH, HEIGHT))
+    labelme_json = create_labelme_file_wayne(
+        img, boundaries.tolist(), "image.tiff", None, save_file=False
+    )
+    return create_label_image(labelme_json, None, save_file=False)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_rasterized_map_equals_polygon_map(seed):
+    rng = np.random.default_rng(seed)
+    boundaries = random_boundaries(rng, num_layers=rng.integers(1, 7))
+    assert can_rasterize_boundaries(boundaries)
+
+    expected = polygon_label_map(boundaries)
+    label_map = boundaries_to_label_map(boundaries, HEIGHT)
+
+    assert label_map.dtype == expected.dtype
+    np.testing.assert_array_equal(label_map, expected)
+
+
+def test_merging_boundaries():
+    # The inner boundaries converge to row 30, the outer ones to the top and
+    # bottom rows, one row per column
+    start = np.array([[4], [24], [28], [32], [36], [HEIGHT - 20]])
+    target = np.array([[1], [30], [30], [30], [30], [HEIGHT - 1]])
+    columns = np.arange(WIDTH)
+    boundaries = start + np.sign(target - start) * np.minimum(
+        columns, np.abs(target - start)
+    )
+    assert can_rasterize_boundaries(boundaries)
+    np.testing.assert_array_equal(
+        boundaries_to_label_map(boundaries, HEIGHT), polygon_label_map(boundaries)
+    )
+
+
+def test_crossing_boundaries_use_polygons():
+    boundaries = random_boundaries(np.random.default_rng(0))
+    boundaries[[1, 2], 10] = boundaries[[2, 1], 10] + [1, -1]
+    assert not can_rasterize_boundaries(boundaries)
+
+
+def test_too_many_layers_use_polygons():
+    boundaries = random_boundaries(np.random.default_rng(0), num_layers=7)
+    assert not can_rasterize_boundaries(boundaries)
+
+
+def test_steep_boundaries_use_polygons():
+    boundaries = random_boundaries(np.random.default_rng(0))
+    boundaries[-1, 20:] = np.minimum(boundaries[-1, 20:] + 2, HEIGHT - 1)
+    assert not can_rasterize_boundaries(boundaries)
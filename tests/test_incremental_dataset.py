@@ -0,0 +1,94 @@
+import os
+
+import h5py
+import numpy as np
+import PIL.Image
+import pytest
+
+from oct_segmenter.preprocessing import generic_dataset
+from oct_segmenter.preprocessing.generic_dataset import update_labeled_images
+
+HEIGHT, WIDTH = 32, 32
+
+
+def write_input_file(input_dir, name, seed):
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 256, size=(HEIGHT, WIDTH), dtype=np.uint8)
+    PIL.Image.fromarray(image).save(input_dir / f"{name}.tiff")
+    boundaries = np.sort(rng.integers(1, HEIGHT, size=(2, 1)), axis=0)
+    mask = np.sum(np.arange(HEIGHT)[:, np.newaxis] >= boundaries[:, np.newaxis], 0)
+    np.savetxt(input_dir / f"{name}.csv", np.tile(mask, (1, WIDTH)), "%d", ",")
+
+
+def update(input_dir, tmp_path, file_name):
+    with h5py.File(file_name, "a") as hf:
+        update_labeled_images(
+            hf,
+            input_dir,
+            tmp_path / "output",
+            "mask",
+            False,
+            None,
+            annotation_cache=False,
+        )
+
+
+def read_datasets(file_name):
+    with h5py.File(file_name, "r") as hf:
+        return {
+            key: hf[key][()]
+            for key in ("xhat", "yhat", "image_source", "xhat_fingerprints/rows")
+        }
+
+
+@pytest.fixture
+def labeled_files(monkeypatch):
+    labeled = []
+    iter_labeled_files = generic_dataset.iter_labeled_files
+
+    def counting_iter_labeled_files(input_files, *args, **kwargs):
+        labeled.extend(input_files)
+        return iter_labeled_files(input_files, *args, **kwargs)
+
+    monkeypatch.setattr(
+        generic_dataset, "iter_labeled_files", counting_iter_labeled_files
+    )
+    return labeled
+
+
+def test_update_from_another_working_directory(tmp_path, monkeypatch, labeled_files):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    for i in range(3):
+        write_input_file(input_dir, f"image{i}", i)
+    file_name = tmp_path / "dataset.hdf5"
+
+    monkeypatch.chdir(tmp_path)
+    update(input_dir.relative_to(tmp_path), tmp_path, file_name)
+    assert len(labeled_files) == 3
+
+    (tmp_path / "elsewhere").mkdir()
+    monkeypatch.chdir(tmp_path / "elsewhere")
+    update(input_dir, tmp_path, file_name)
+    assert len(labeled_files) == 3
+    assert sorted(read_datasets(file_name)["xhat_fingerprints/rows"]) == [
+        f"image{i}.tiff".encode() for i in range(3)
+    ]
+
+
+def test_removing_every_input_file_leaves_the_datasets(tmp_path, labeled_files):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    for i in range(2):
+        write_input_file(input_dir, f"image{i}", i)
+    file_name = tmp_path / "dataset.hdf5"
+    update(input_dir, tmp_path, file_name)
+    datasets = read_datasets(file_name)
+
+    for name in os.listdir(input_dir):
+        os.remove(input_dir / name)
+    with pytest.raises(SystemExit):
+        update(input_dir, tmp_path, file_name)
+
+    for key, values in read_datasets(file_name).items():
+        np.testing.assert_array_equal(values, datasets[key])
@@ -0,0 +1,103 @@
+import json
+
+import numpy as np
+import PIL.Image
+import pytest
+
+from oct_segmenter import WAYNE_STATE_LAYER_NAMES
+from oct_segmenter.common import utils
+from oct_segmenter.common.json_reader import LazyJSONString, read_json_object
+from oct_segmenter.preprocessing.image_labeling_labelme import (
+    generate_image_label_labelme,
+)
+
+IMAGE_DATA = 'iVBORw0KGgo\\"quoted\\\\"/+=='
+
+
+def write_json(tmp_path, text, name="file.json"):
+    path = tmp_path / name
+    path.write_text(text)
+    return path
+
+
+def resolve(obj):
+    return {
+        key: value.load() if isinstance(value, LazyJSONString) else value
+        for key, value in obj.items()
+    }
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        # Fast path: the key appears once, at the top level
+        {"imageData": IMAGE_DATA, "shapes": [], "imageHeight": 1},
+        # Nested key after / before the top-level one
+        {"imageData": IMAGE_DATA, "shapes": [{"imageData": "nested"}]},
+        {"flags": {"imageData": "nested"}, "imageData": IMAGE_DATA},
+        # Only nested
+        {"shapes": [{"imageData": "nested"}], "imageWidth": 2},
+        # Key name inside a string value
+        {"imagePath": '"imageData": "x"', "imageData": IMAGE_DATA},
+    ],
+)
+def test_read_json_object_equals_json_load(tmp_path, document):
+    path = write_json(tmp_path, json.dumps(document))
+
+    obj = read_json_object(path, lazy_keys=["imageData"])
+
+    assert resolve(obj) == document
+    if "imageData" in document:
+        assert isinstance(obj["imageData"], LazyJSONString)
+
+
+def test_non_string_and_non_object_values(tmp_path):
+    path = write_json(tmp_path, json.dumps({"imageData": None}))
+    assert read_json_object(path, lazy_keys=["imageData"]) == {"imageData": None}
+
+    path = write_json(tmp_path, json.dumps([{"imageData": "x"}]))
+    assert read_json_object(path, lazy_keys=["imageData"]) == [{"imageData": "x"}]
+
+
+def write_labelme_file(tmp_path, name, extra_flags=None):
+    height, width = 96, 832
+    rng = np.random.default_rng(0)
+    img = PIL.Image.fromarray(rng.integers(0, 256, (height, width), dtype=np.uint8))
+    xs = list(range(0, width, 20)) + [width - 1]
+    rows = np.sort(rng.integers(5, 90, size=(len(WAYNE_STATE_LAYER_NAMES), 1)), 0)
+    shapes = [
+        {
+            "label": label,
+            "points": [[x, int(row[0])] for x in xs],
+            "group_id": None,
+            "shape_type": "linestrip",
+            "flags": dict(extra_flags or {}),
+        }
+        for label, row in zip(WAYNE_STATE_LAYER_NAMES, rows)
+    ]
+    labelme = {
+        "version": "4.5.9",
+        "flags": dict(extra_flags or {}),
+        "shapes": shapes,
+        "imagePath": name + ".tiff",
+        "imageData": str(utils.img_data_to_img_b64(utils.pil_to_data(img)), "utf-8"),
+        "imageHeight": height,
+        "imageWidth": width,
+    }
+    return write_json(tmp_path, json.dumps(labelme), name + ".json")
+
+
+def test_labelme_file_with_nested_image_data(tmp_path):
+    plain = write_labelme_file(tmp_path, "plain")
+    nested = write_labelme_file(tmp_path, "nested", {"imageData": "not an image"})
+
+    _, img, label_map, boundaries = generate_image_label_labelme(
+        plain, tmp_path, WAYNE_STATE_LAYER_NAMES, save_file=False
+    )
+    _, nested_img, nested_label_map, nested_boundaries = generate_image_label_labelme(
+        nested, tmp_path, WAYNE_STATE_LAYER_NAMES, save_file=False
+    )
+
+    np.testing.assert_array_equal(nested_img, img)
+    np.testing.assert_array_equal(nested_label_map, label_map)
+    np.testing.assert_array_equal(nested_boundaries, boundaries)
@@ -0,0 +1,127 @@
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from oct_segmenter.common.model_cache import (
+    MODEL_LIBRARY,
+    ModelCache,
+    cached_loader,
+    rebind_library_functions,
+)
+
+
+def custom_loss():
+    pass
+
+
+def test_custom_objects_are_part_of_the_key(tmp_path):
+    model_path = tmp_path / "model.hdf5"
+    model_path.write_bytes(b"model")
+    loads = []
+
+    def load_model(path, custom_objects=None, compile=True):
+        loads.append(path)
+        return object()
+
+    load = cached_loader(load_model, ModelCache(2))
+    first = load(model_path, custom_objects={"loss": custom_loss})
+    again = load(model_path, custom_objects={"loss": custom_loss})
+    other = load(model_path, compile=False)
+
+    assert first is again
+    assert other is not first
+    assert len(loads) == 2
+
+
+def test_hold_keeps_a_model_when_the_cache_is_disabled():
+    cache = ModelCache(0)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return object()
+
+    with cache.hold():
+        for _ in range(3):
+            cache.get("model", loader)
+    assert len(loads) == 1
+
+    # The cache is disabled again after the context
+    assert len(cache) == 0
+    cache.get("model", loader)
+    assert len(loads) == 2
+
+
+def test_a_slow_load_does_not_block_other_models():
+    cache = ModelCache(2)
+    cached = cache.get("cached", object)
+    loading = threading.Event()
+    release = threading.Event()
+
+    def slow_loader():
+        loading.set()
+        release.wait(5)
+        return object()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        slow = executor.submit(cache.get, "slow", slow_loader)
+        assert loading.wait(5)
+        # Returned while the other model is still loading
+        assert cache.get("cached", object) is cached
+        assert not slow.done()
+        release.set()
+        slow.result()
+
+
+def test_concurrent_loads_of_a_model_load_it_once():
+    cache = ModelCache(1)
+    loads = []
+    release = threading.Event()
+
+    def loader():
+        loads.append(1)
+        release.wait(5)
+        return object()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(cache.get, "model", loader) for _ in range(4)]
+        time.sleep(0.1)
+        release.set()
+        models = [future.result() for future in futures]
+
+    assert len(loads) == 1
+    assert all(model is models[0] for model in models)
+
+
+def test_failed_loads_are_not_cached():
+    cache = ModelCache(1)
+
+    def failing_loader():
+        raise OSError("Model not found")
+
+    with pytest.raises(OSError):
+        cache.get("model", failing_loader)
+    model = cache.get("model", object)
+    assert cache.get("model", object) is model
+
+
+def test_library_modules_are_rebound(monkeypatch):
+    def load_model(path):
+        return object()
+
+    wrapper = cached_loader(load_model, ModelCache(1))
+    library_module = types.ModuleType(f"{MODEL_LIBRARY}.fake")
+    library_module.load_model = load_model
+    other_module = types.ModuleType("other")
+    other_module.load_model = load_model
+    monkeypatch.setitem(sys.modules, library_module.__name__, library_module)
+    monkeypatch.setitem(sys.modules, other_module.__name__, other_module)
+
+    rebind_library_functions({load_model: wrapper})
+
+    assert library_module.load_model is wrapper
+    assert other_module.load_model is load_model
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from oct_segmenter.common.models_registry import load_models_index, models_index_path
+
+
+def make_model(models_dir: Path, name: str):
+    model_dir = models_dir / name
+    model_dir.mkdir(parents=True)
+    (model_dir / "model.hdf5").write_bytes(name.encode())
+
+
+def test_models_dirs_have_separate_indices(tmp_path):
+    index_dir = tmp_path / "index"
+    first_dir, second_dir = tmp_path / "first", tmp_path / "second"
+    make_model(first_dir, "a")
+    make_model(first_dir, "b")
+    make_model(second_dir, "c")
+
+    first_path = models_index_path(first_dir, index_dir)
+    second_path = models_index_path(second_dir, index_dir)
+    assert first_path != second_path
+
+    first = load_models_index(first_dir, first_path)
+    second = load_models_index(second_dir, second_path)
+    assert [(m["index"], m["name"]) for m in first] == [(0, "a"), (1, "b")]
+    assert [(m["index"], m["name"]) for m in second] == [(0, "c")]
+
+    # Loading the other directory did not reset the indices of the first one
+    make_model(first_dir, "0")
+    first = load_models_index(first_dir, first_path)
+    assert [(m["index"], m["name"]) for m in first] == [(0, "a"), (1, "b"), (2, "0")]
+
+
+def test_index_path_uses_resolved_models_dir(tmp_path):
+    (tmp_path / "models").mkdir()
+    assert models_index_path(tmp_path / "models", tmp_path) == models_index_path(
+        tmp_path / "models" / ".." / "models", tmp_path
+    )
@@ -0,0 +1,52 @@
+import subprocess
+import sys
+
+import pytest
+
+# Modules that only the training, evaluation and prediction commands need
+HEAVY_MODULES = ["tensorflow", "oct_image_segmentation_models", "mlflow"]
+
+# Runs the CLI (or imports a command module) and prints the heavy modules that
+# were imported
+SCRIPT = """
+import runpy
+import sys
+
+sys.argv = ["oct-segmenter"] + sys.argv[1:]
+if sys.argv[1].startswith("oct_segmenter."):
+    __import__(sys.argv[1])
+else:
+    try:
+        runpy.run_module("oct_segmenter", run_name="__main__")
+    except SystemExit:
+        pass
+heavy = [m for m in {heavy} if m in sys.modules]
+print("HEAVY:" + ",".join(heavy))
+"""
+
+
+def run_cli(*args):
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(heavy=HEAVY_MODULES), *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    heavy_line = result.stdout.strip().splitlines()[-1]
+    return heavy_line.removeprefix("HEAVY:")
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--help"],
+        ["partition", "--help"],
+        ["label", "--help"],
+        ["generate", "training", "--help"],
+        ["oct_segmenter.commands.partition"],
+        ["oct_segmenter.commands.label"],
+    ],
+)
+def test_light_commands_do_not_import_ml_stack(args):
+    # Checked instead of the startup time, which depends on the machine
+    assert run_cli(*args) == ""